@@ -0,0 +1,74 @@
+local balancer = require("ngx.balancer")
+local resolver = require("resty.dns.resolver")
+local routes = require("routes")
+
+local _M = {}
+
+local NAMESERVER = "127.0.0.11"
+local REFRESH_INTERVAL = 5
+
+-- Peers are resolved from a timer, not per request: cosockets are not
+-- available in balancer_by_lua, and a stale address must not outlive a
+-- backend container restart for longer than one refresh interval.
+local function resolve(host)
+  local r, err = resolver:new({ nameservers = { NAMESERVER }, retrans = 2, timeout = 1000 })
+  if not r then
+    return nil, err
+  end
+
+  local answers, query_err = r:query(host, { qtype = r.TYPE_A })
+  if not answers then
+    return nil, query_err
+  end
+  if answers.errcode then
+    return nil, answers.errstr
+  end
+
+  for _, answer in ipairs(answers) do
+    if answer.address then
+      return answer.address
+    end
+  end
+  return nil, "no A record"
+end
+
+local function refresh(premature)
+  if premature then
+    return
+  end
+
+  local peers = ngx.shared.backend_peers
+  for name, upstream in pairs(routes.upstreams) do
+    local address, err = resolve(upstream.host)
+    if address then
+      peers:set(name, address .. ":" .. (upstream.port or 80))
+    else
+      ngx.log(ngx.WARN, "failed to resolve backend ", upstream.host, ": ", err, ", keeping last address")
+    end
+  end
+end
+
+function _M.init_worker()
+  if ngx.worker.id() ~= 0 then
+    return
+  end
+  ngx.timer.at(0, refresh)
+  ngx.timer.every(REFRESH_INTERVAL, refresh)
+end
+
+function _M.balance(name)
+  local peer = ngx.shared.backend_peers:get(name)
+  if not peer then
+    ngx.log(ngx.ERR, "no resolved address for backend ", name)
+    return ngx.exit(502)
+  end
+
+  local host, port = peer:match("^(.+):(%d+)$")
+  local ok, err = balancer.set_current_peer(host, tonumber(port))
+  if not ok then
+    ngx.log(ngx.ERR, "failed to set backend peer ", peer, ": ", err)
+    return ngx.exit(502)
+  end
+end
+
+return _M
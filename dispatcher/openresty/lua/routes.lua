@@ -0,0 +1,225 @@
+local cjson = require("cjson.safe")
+
+local byte = string.byte
+local lower = string.lower
+
+local _M = {
+  default = "heralding",
+  upstreams = {},
+  targets = {},
+  matchers = {},
+}
+
+local RULES_FILE = "/etc/yozakura/rules/http_routes.json"
+local FIELDS = { "uri", "user_agent" }
+
+local function load(path)
+  local f, err = io.open(path, "r")
+  if not f then
+    ngx.log(ngx.ERR, "failed to open routing rules ", path, ": ", err)
+    return nil
+  end
+
+  local raw = f:read("*a")
+  f:close()
+
+  local data, decode_err = cjson.decode(raw)
+  if not data then
+    ngx.log(ngx.ERR, "failed to parse routing rules ", path, ": ", decode_err)
+  end
+  return data
+end
+
+-- Aho-Corasick automaton flattened into a DFA: delta[state][byte] holds every
+-- transition that does not lead back to the root, out[state] the lowest rule
+-- index whose pattern ends at that state (or follows from its fail chain).
+local function compile(patterns)
+  local goto_, fail, out = { {} }, { 1 }, { false }
+
+  for _, entry in ipairs(patterns) do
+    local state = 1
+    local pattern = entry.pattern
+    for i = 1, #pattern do
+      local b = byte(pattern, i)
+      local next_state = goto_[state][b]
+      if not next_state then
+        next_state = #goto_ + 1
+        goto_[next_state] = {}
+        out[next_state] = false
+        goto_[state][b] = next_state
+      end
+      state = next_state
+    end
+    if not out[state] or entry.rule < out[state] then
+      out[state] = entry.rule
+    end
+  end
+
+  local delta = { {} }
+  local queue, head = {}, 1
+  for b, child in pairs(goto_[1]) do
+    fail[child] = 1
+    delta[1][b] = child
+    queue[#queue + 1] = child
+  end
+
+  while head <= #queue do
+    local state = queue[head]
+    head = head + 1
+
+    local row = {}
+    for b, target in pairs(delta[fail[state]]) do
+      row[b] = target
+    end
+
+    local inherited = out[fail[state]]
+    if inherited and (not out[state] or inherited < out[state]) then
+      out[state] = inherited
+    end
+
+    for b, child in pairs(goto_[state]) do
+      fail[child] = delta[fail[state]][b] or 1
+      row[b] = child
+      queue[#queue + 1] = child
+    end
+    delta[state] = row
+  end
+
+  return { delta = delta, out = out }
+end
+
+local function scan(matcher, s, best)
+  local delta, out = matcher.delta, matcher.out
+  local state = 1
+  for i = 1, #s do
+    state = delta[state][byte(s, i)] or 1
+    local rule = out[state]
+    if rule and rule < best then
+      best = rule
+      if best == 1 then
+        return best
+      end
+    end
+  end
+  return best
+end
+
+function _M.init(path)
+  local data = load(path or RULES_FILE)
+  if not data then
+    return
+  end
+
+  local targets = {}
+  local by_field = {}
+  for _, field in ipairs(FIELDS) do
+    by_field[field] = {}
+  end
+
+  for index, rule in ipairs(data.rules or {}) do
+    targets[index] = rule.target
+    for _, field in ipairs(rule.fields or { "uri" }) do
+      local patterns = by_field[field]
+      if not patterns then
+        ngx.log(ngx.ERR, "unknown routing field ", field, " for ", rule.target)
+      else
+        for _, pattern in ipairs(rule.patterns or {}) do
+          if pattern ~= "" then
+            patterns[#patterns + 1] = { pattern = lower(pattern), rule = index }
+          end
+        end
+      end
+    end
+  end
+
+  local matchers = {}
+  for field, patterns in pairs(by_field) do
+    if #patterns > 0 then
+      matchers[field] = compile(patterns)
+    end
+  end
+
+  _M.default = data.default or _M.default
+  _M.upstreams = data.upstreams or {}
+  _M.targets = targets
+  _M.matchers = matchers
+end
+
+function _M.route(uri, dec_uri, ua)
+  local none = #_M.targets + 1
+  local best = none
+
+  local matcher = _M.matchers.uri
+  if matcher then
+    best = scan(matcher, uri, best)
+    if best > 1 and dec_uri ~= uri then
+      best = scan(matcher, dec_uri, best)
+    end
+  end
+
+  matcher = _M.matchers.user_agent
+  if matcher and best > 1 then
+    best = scan(matcher, ua, best)
+  end
+
+  if best == none then
+    return _M.default
+  end
+  return _M.targets[best]
+end
+
+function _M.decide(raw_uri, raw_ua)
+  local cache = ngx.shared.route_cache
+  local stats = ngx.shared.route_stats
+  local key = cache and ngx.md5_bin(raw_uri .. "\0" .. raw_ua)
+
+  local target = key and cache:get(key)
+  if target then
+    if stats then
+      stats:incr("cache_hit", 1, 0)
+    end
+  else
+    local uri = lower(raw_uri)
+    target = _M.route(uri, ngx.unescape_uri(uri), lower(raw_ua))
+    if key then
+      cache:set(key, target)
+      if stats then
+        stats:incr("cache_miss", 1, 0)
+      end
+    end
+  end
+
+  if stats then
+    stats:incr("route:" .. target, 1, 0)
+  end
+  return target
+end
+
+function _M.stats()
+  local stats = ngx.shared.route_stats
+  if not stats then
+    return {}
+  end
+
+  local hits = stats:get("cache_hit") or 0
+  local misses = stats:get("cache_miss") or 0
+  local routes = {}
+
+  for _, key in ipairs(stats:get_keys(0)) do
+    local target = key:match("^route:(.+)$")
+    if target then
+      routes[target] = stats:get(key) or 0
+    end
+  end
+
+  local cache = ngx.shared.route_cache
+  return {
+    cache_hit = hits,
+    cache_miss = misses,
+    cache_hit_rate = (hits + misses) > 0 and hits / (hits + misses) or 0,
+    cache_free_bytes = cache and cache:free_space() or 0,
+    routes = routes,
+  }
+end
+
+return _M
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+
+from detector import detect
+
+CORPUS_FILE = os.path.join(BASE_DIR, "bench", "corpus", "bot_commands.txt")
+SIGNATURE_FILE = os.path.join(BASE_DIR, "config", "signatures.txt")
+
+def naive_classify(literals, command: str) -> set:
+  lowered = command.lower()
+  return {category for category, pattern in literals if pattern in lowered}
+
+def measure(func, commands, rounds: int) -> float:
+  start = time.perf_counter()
+  for _ in range(rounds):
+    for command in commands:
+      func(command)
+  return time.perf_counter() - start
+
+def main():
+  rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+  with open(CORPUS_FILE, "r", encoding="utf-8") as f:
+    commands = [line.rstrip("\n") for line in f if line.strip()]
+
+  build_start = time.perf_counter()
+  classifier = detect.CommandClassifier(SIGNATURE_FILE)
+  build_time = time.perf_counter() - build_start
+  literals, _ = detect.load_signatures(SIGNATURE_FILE)
+
+  total = len(commands) * rounds
+  elapsed = measure(classifier.classify, commands, rounds)
+  naive_elapsed = measure(lambda command: naive_classify(literals, command), commands, rounds)
+
+  tagged = sum(1 for command in commands if classifier.classify(command))
+
+  print(f"signatures:          {classifier.signature_count}")
+  print(f"automaton states:    {len(classifier.automaton.goto)}")
+  print(f"build time:          {build_time * 1000:.2f} ms")
+  print(f"corpus commands:     {len(commands)} ({tagged} tagged)")
+  print(f"classify:            {elapsed / total * 1e6:.2f} us/command ({total / elapsed:,.0f} commands/s)")
+  print(f"naive literal scan:  {naive_elapsed / total * 1e6:.2f} us/command (literals only)")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,70 @@
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+
+from utils import geoip
+
+COUNTRIES = ("US", "CN", "JP", "DE", "RU", "BR", "NL", "KR", "IN", "VN")
+
+def synthetic_ranges(count: int) -> list:
+  rng = random.Random(42)
+  starts = sorted(rng.sample(range(1 << 32), count))
+  ranges = []
+  for start, following in zip(starts, starts[1:] + [1 << 32]):
+    end = min(following - 1, start + rng.randint(255, 65535))
+    asn = rng.randint(1, 400000)
+    ranges.append((start, end, rng.choice(COUNTRIES), asn, f"AS{asn} Hosting"))
+  return ranges
+
+def addresses(database, count: int, distinct: int) -> list:
+  rng = random.Random(7)
+  pool = []
+  for _ in range(distinct):
+    index = rng.randrange(database.ranges)
+    address = rng.randint(database.starts[index], database.ends[index])
+    pool.append(socket.inet_ntoa(address.to_bytes(4, "big")))
+  return [rng.choice(pool) for _ in range(count)]
+
+def measure(func, values: list) -> float:
+  started = time.perf_counter_ns()
+  for value in values:
+    func(value)
+  return (time.perf_counter_ns() - started) / len(values)
+
+def main():
+  path = sys.argv[1] if len(sys.argv) > 1 else None
+  lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+  with tempfile.TemporaryDirectory() as tmp:
+    if path is None:
+      path = os.path.join(tmp, "geoip.db")
+      geoip.write_database(synthetic_ranges(500000), path)
+
+    database = geoip.GeoDatabase(path)
+    geoip.DB = database
+    hot = addresses(database, lookups, 2000)
+    cold = addresses(database, lookups, lookups)
+    numeric = [int.from_bytes(socket.inet_aton(ip), "big") for ip in cold]
+
+    find = measure(database.find, numeric)
+    geoip._lookup.cache_clear()
+    miss = measure(geoip.lookup, cold)
+    geoip._lookup.cache_clear()
+    measure(geoip.lookup, hot[:2000])
+    hit = measure(geoip.lookup, hot)
+    info = geoip.metrics()
+
+  print(f"ranges:              {database.ranges:,}")
+  print(f"binary search:       {find:,.0f} ns/lookup")
+  print(f"cold (unique IPs):   {miss:,.0f} ns/lookup")
+  print(f"hot (2k IPs):        {hit:,.0f} ns/lookup")
+  print(f"cache hit rate:      {info['cache_hit_rate']:.2%}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,75 @@
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+
+from utils import event_encoder, geoip, log_event
+
+def legacy_command_event(path, src_ip, src_port, username, command, cwd, session_id):
+  log = {
+    "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    "type": "Paramiko",
+    "eventid": "paramiko.command.input",
+    "src_ip": src_ip,
+    "src_port": src_port,
+    "username": username,
+    "command": command,
+    "cwd": cwd,
+    "protocol": "ssh",
+    "dispatcher_session": session_id,
+    "classification": ["recon"],
+  }
+  with open(path, "a") as f:
+    f.write(json.dumps(log) + "\n")
+
+def encoded_command_event(path, src_ip, src_port, username, command, cwd, session_id):
+  timestamp = event_encoder.CLOCK.isoformat()
+  line = log_event.COMMAND_TEMPLATE.encode(timestamp, (src_ip, src_port, username, command, cwd, session_id, ["recon"]) + geoip.lookup(src_ip))
+  event_encoder.WRITER.write(path, line + "\n")
+
+def run(func, path: str, threads: int, events: int) -> float:
+  barrier = threading.Barrier(threads + 1)
+
+  def producer(worker: int):
+    barrier.wait()
+    for i in range(events):
+      func(path, "203.0.113.7", 40000 + worker, "root", f"cat /proc/cpuinfo | grep name | wc -l # {i}", "/root", "a1b2c3d4e5f6")
+
+  workers = [threading.Thread(target=producer, args=(worker,)) for worker in range(threads)]
+  for worker in workers:
+    worker.start()
+  barrier.wait()
+  started = time.perf_counter()
+  for worker in workers:
+    worker.join()
+  return time.perf_counter() - started
+
+def main():
+  threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+  events = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+  total = threads * events
+
+  with tempfile.TemporaryDirectory() as tmp:
+    legacy_path = os.path.join(tmp, "legacy.log")
+    encoded_path = os.path.join(tmp, "encoded.log")
+    legacy = run(legacy_command_event, legacy_path, threads, events)
+    encoded = run(encoded_command_event, encoded_path, threads, events)
+
+    with open(encoded_path, "r", encoding="utf-8") as f:
+      for line in f:
+        json.loads(line)
+
+  print(f"backend:             {event_encoder.BACKEND}")
+  print(f"producers:           {threads} x {events} events")
+  print(f"legacy dict + open:  {total / legacy:,.0f} events/s ({legacy / total * 1e6:.2f} us/event)")
+  print(f"template + writer:   {total / encoded:,.0f} events/s ({encoded / total * 1e6:.2f} us/event)")
+  print(f"speedup:             {legacy / encoded:.2f}x")
+
+if __name__ == "__main__":
+  main()
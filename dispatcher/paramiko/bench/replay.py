@@ -0,0 +1,382 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import bisect
+import datetime
+import json
+import re
+import socket
+import statistics
+import threading
+import time
+
+import paramiko
+
+ANSI_ESCAPE_RE = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+PROMPT_RE = re.compile(r"[#$] $")
+
+class Session:
+  def __init__(self, key, src_ip: str, start: float):
+    self.key = key
+    self.src_ip = src_ip
+    self.start = start
+    self.end = start
+    self.attempts = []
+    self.commands = []
+    self.interactive = False
+    self.duration = None
+
+  def touch(self, timestamp: float):
+    self.start = min(self.start, timestamp)
+    self.end = max(self.end, timestamp)
+
+  @property
+  def original_duration(self) -> float:
+    return self.duration if self.duration is not None else self.end - self.start
+
+  @property
+  def mode(self) -> str:
+    if self.interactive:
+      return "shell"
+    return "exec" if self.commands else "auth"
+
+def _parse_time(value: str) -> float:
+  return datetime.datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def _parse_duration(value) -> float:
+  if isinstance(value, str):
+    value = value.rstrip("s")
+  try:
+    return float(value)
+  except (TypeError, ValueError):
+    return None
+
+def _read_events(path: str):
+  with open(path, "r", encoding="utf-8", errors="replace") as f:
+    for line in f:
+      try:
+        event = json.loads(line)
+      except ValueError:
+        continue
+      if isinstance(event, dict) and "timestamp" in event:
+        yield event
+
+def _session_for(sessions: dict, key, event: dict, timestamp: float) -> Session:
+  session = sessions.get(key)
+  if session is None:
+    session = sessions[key] = Session(key, event.get("src_ip", ""), timestamp)
+  session.touch(timestamp)
+  return session
+
+def load_paramiko(path: str) -> list:
+  sessions = {}
+  for event in _read_events(path):
+    eventid = event.get("eventid", "")
+    if not eventid.startswith("paramiko.") or eventid == "paramiko.analytics.snapshot":
+      continue
+
+    key = event.get("dispatcher_session") or (event.get("src_ip"), event.get("src_port"))
+    timestamp = _parse_time(event["timestamp"])
+    session = _session_for(sessions, key, event, timestamp)
+
+    if eventid == "paramiko.login.attempt":
+      session.attempts.append((timestamp, event.get("username", ""), event.get("password", ""), bool(event.get("success"))))
+    elif eventid == "paramiko.command.input":
+      session.commands.append((timestamp, event.get("command", "")))
+    elif eventid == "paramiko.session.close":
+      session.interactive = True
+      session.duration = _parse_duration(event.get("duration"))
+
+  return sorted(sessions.values(), key=lambda session: session.start)
+
+def load_session_map(path: str) -> dict:
+  mappings = {}
+  for event in _read_events(path):
+    if event.get("eventid") != "paramiko.session.backend" or event.get("backend") != "cowrie":
+      continue
+    key = (event.get("backend_src_ip"), event.get("backend_src_port"))
+    mappings.setdefault(key, []).append((_parse_time(event["timestamp"]), event.get("dispatcher_session"), event.get("purpose", "")))
+  for entries in mappings.values():
+    entries.sort(key=lambda entry: entry[0])
+  return mappings
+
+def _mapping_for(mappings: dict, src_ip: str, src_port, timestamp: float):
+  entries = mappings.get((src_ip, src_port))
+  if not entries:
+    return None
+  index = bisect.bisect_right(entries, timestamp, key=lambda entry: entry[0]) - 1
+  return entries[max(index, 0)]
+
+def join_cowrie(path: str, mappings: dict, sessions: list) -> dict:
+  # Cowrie is only reachable through the dispatcher, so every Cowrie session is
+  # backend work caused by a paramiko session: attribute it instead of replaying it.
+  replayed = {session.key for session in sessions}
+  purposes = {}
+  stats = Counter()
+
+  for event in _read_events(path):
+    key = event.get("session")
+    if not key:
+      continue
+
+    if event.get("eventid") == "cowrie.session.connect":
+      stats["cowrie_sessions"] += 1
+      mapping = _mapping_for(mappings, event.get("src_ip"), event.get("src_port"), _parse_time(event["timestamp"]))
+      if mapping is None:
+        stats["unjoined"] += 1
+        continue
+      _, dispatcher_session, purpose = mapping
+      purposes[key] = purpose
+      stats[f"purpose:{purpose}"] += 1
+      if dispatcher_session in replayed:
+        stats["joined"] += 1
+    elif event.get("eventid") == "cowrie.command.input" and key in purposes:
+      stats[f"commands:{purposes[key]}"] += 1
+
+  return {
+    "cowrie_sessions": stats["cowrie_sessions"],
+    "joined": stats["joined"],
+    "unjoined": stats["unjoined"],
+    "backend_sessions_per_replayed_session": round(stats["joined"] / len(sessions), 3) if sessions else 0.0,
+    "backend_sessions_by_purpose": {name[8:]: count for name, count in stats.items() if name.startswith("purpose:")},
+    "cowrie_commands_by_purpose": {name[9:]: count for name, count in stats.items() if name.startswith("commands:")},
+  }
+
+class Results:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.latencies = {"connect": [], "auth": [], "command": [], "exec": []}
+    self.errors = {}
+    self.sessions = 0
+    self.modes = {}
+    self.auth_mismatches = 0
+    self.commands_expected = 0
+    self.commands_completed = 0
+    self.duration_deltas = []
+    self.start_lags = []
+
+  def latency(self, kind: str, value: float):
+    with self.lock:
+      self.latencies[kind].append(value)
+
+  def error(self, kind: str):
+    with self.lock:
+      self.errors[kind] = self.errors.get(kind, 0) + 1
+
+  def finish(self, session: Session, auth_mismatches: int, completed: int, duration: float, lag: float, speed: float):
+    with self.lock:
+      self.sessions += 1
+      self.modes[session.mode] = self.modes.get(session.mode, 0) + 1
+      self.auth_mismatches += auth_mismatches
+      self.commands_expected += len(session.commands)
+      self.commands_completed += completed
+      self.duration_deltas.append(duration * speed - session.original_duration)
+      self.start_lags.append(lag)
+
+def _percentiles(values: list) -> dict:
+  if not values:
+    return {"count": 0}
+  ordered = sorted(values)
+  pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+  return {
+    "count": len(ordered),
+    "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+    "p50_ms": round(pick(0.50) * 1000, 2),
+    "p95_ms": round(pick(0.95) * 1000, 2),
+    "p99_ms": round(pick(0.99) * 1000, 2),
+    "max_ms": round(ordered[-1] * 1000, 2),
+  }
+
+def _read_until_prompt(chan, timeout: float) -> bool:
+  deadline = time.time() + timeout
+  buffer = ""
+  while time.time() < deadline:
+    if chan.recv_ready():
+      buffer += chan.recv(4096).decode("utf-8", errors="ignore")
+      if PROMPT_RE.search(ANSI_ESCAPE_RE.sub("", buffer)):
+        return True
+    elif chan.closed or chan.exit_status_ready():
+      return False
+    else:
+      time.sleep(0.01)
+  return False
+
+def _run_exec(transport, session: Session, results: Results, timeout: float) -> int:
+  completed = 0
+  for _, command in session.commands:
+    started = time.perf_counter()
+    try:
+      chan = transport.open_session(timeout=timeout)
+      chan.settimeout(timeout)
+      chan.exec_command(command)
+      while chan.recv(4096):
+        pass
+      results.latency("exec", time.perf_counter() - started)
+      completed += 1
+      chan.close()
+    except Exception as e:
+      results.error(f"exec:{type(e).__name__}")
+  return completed
+
+def _run_shell(transport, session: Session, results: Results, timeout: float, speed: float, think: bool) -> int:
+  completed = 0
+  try:
+    chan = transport.open_session(timeout=timeout)
+    chan.get_pty()
+    chan.invoke_shell()
+  except Exception as e:
+    results.error(f"shell:{type(e).__name__}")
+    return completed
+
+  try:
+    if not _read_until_prompt(chan, timeout):
+      results.error("shell:no_prompt")
+      return completed
+
+    previous = session.commands[0][0] if session.commands else session.start
+    for timestamp, command in session.commands:
+      if think:
+        time.sleep(max(0.0, (timestamp - previous) / speed))
+      previous = timestamp
+
+      started = time.perf_counter()
+      chan.send(command + "\r")
+      if command.strip().lower() in ("exit", "quit", "exit;", "quit;"):
+        completed += 1
+        break
+      if not _read_until_prompt(chan, timeout):
+        results.error("shell:command_timeout")
+        break
+      results.latency("command", time.perf_counter() - started)
+      completed += 1
+  finally:
+    chan.close()
+
+  return completed
+
+def replay_session(session: Session, target: tuple, results: Results, timeout: float, speed: float, think: bool, due: float):
+  lag = max(0.0, time.time() - due)
+  started = time.perf_counter()
+  transport = None
+  sock = None
+  auth_mismatches = 0
+  completed = 0
+
+  try:
+    sock = socket.create_connection(target, timeout=timeout)
+    transport = paramiko.Transport(sock)
+    transport.start_client(timeout=timeout)
+    results.latency("connect", time.perf_counter() - started)
+
+    authenticated = False
+    for _, username, password, original_success in session.attempts:
+      attempt_started = time.perf_counter()
+      try:
+        transport.auth_password(username, password)
+        authenticated = True
+      except paramiko.AuthenticationException:
+        authenticated = False
+      results.latency("auth", time.perf_counter() - attempt_started)
+
+      if authenticated != original_success:
+        auth_mismatches += 1
+      if authenticated:
+        break
+
+    if authenticated and session.mode == "shell":
+      completed = _run_shell(transport, session, results, timeout, speed, think)
+    elif authenticated and session.mode == "exec":
+      completed = _run_exec(transport, session, results, timeout)
+
+  except Exception as e:
+    results.error(f"connect:{type(e).__name__}")
+  finally:
+    if transport is not None:
+      transport.close()
+    elif sock is not None:
+      sock.close()
+    results.finish(session, auth_mismatches, completed, time.perf_counter() - started, lag, speed)
+
+def replay(sessions: list, target: tuple, concurrency: int, speed: float, timeout: float, think: bool) -> Results:
+  results = Results()
+  if not sessions:
+    return results
+
+  origin = sessions[0].start
+  wall_start = time.time()
+
+  with ThreadPoolExecutor(max_workers=concurrency) as pool:
+    for session in sessions:
+      due = wall_start + (session.start - origin) / speed
+      delay = due - time.time()
+      if delay > 0:
+        time.sleep(delay)
+      pool.submit(replay_session, session, target, results, timeout, speed, think, due)
+
+  return results
+
+def summarize(sessions: list, results: Results, elapsed: float, speed: float, backend: dict = None) -> dict:
+  original_span = (sessions[-1].start - sessions[0].start) if sessions else 0.0
+  original_attempts = sum(len(session.attempts) for session in sessions)
+  original_successes = sum(1 for session in sessions for attempt in session.attempts if attempt[3])
+
+  return {
+    "speed": speed,
+    "sessions": results.sessions,
+    "modes": results.modes,
+    "original_span_seconds": round(original_span, 3),
+    "replay_wall_seconds": round(elapsed, 3),
+    "original_connections_per_second": round(len(sessions) / original_span, 3) if original_span else None,
+    "replay_connections_per_second": round(results.sessions / elapsed, 3) if elapsed else None,
+    "original_auth_attempts": original_attempts,
+    "original_auth_successes": original_successes,
+    "auth_outcome_mismatches": results.auth_mismatches,
+    "commands_expected": results.commands_expected,
+    "commands_completed": results.commands_completed,
+    "errors": results.errors,
+    "latency": {kind: _percentiles(values) for kind, values in results.latencies.items()},
+    "session_duration_delta": _percentiles(results.duration_deltas),
+    "schedule_lag": _percentiles(results.start_lags),
+    "original_backend": backend,
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description="Replay recorded SSH sessions against the dispatcher.")
+  parser.add_argument("--paramiko-log", required=True, help="path to paramiko.log")
+  parser.add_argument("--cowrie-log", help="path to cowrie.json, joined to paramiko sessions for backend fan-out statistics")
+  parser.add_argument("--session-map", help="path to session_map.log, required with --cowrie-log")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=22)
+  parser.add_argument("--speed", type=float, default=1.0, help="time acceleration factor (1 = real time)")
+  parser.add_argument("--concurrency", type=int, default=200)
+  parser.add_argument("--timeout", type=float, default=30.0)
+  parser.add_argument("--limit", type=int, default=0, help="replay only the first N sessions")
+  parser.add_argument("--no-think", action="store_true", help="send commands back to back instead of with recorded gaps")
+  parser.add_argument("--output", help="write the JSON report to this file")
+  args = parser.parse_args()
+
+  if args.cowrie_log and not args.session_map:
+    parser.error("--cowrie-log needs --session-map to attribute Cowrie sessions to dispatcher sessions")
+
+  sessions = [session for session in load_paramiko(args.paramiko_log) if session.attempts]
+  if not sessions:
+    parser.error("no sessions found in --paramiko-log")
+  if args.limit:
+    sessions = sessions[:args.limit]
+
+  backend = None
+  if args.cowrie_log:
+    backend = join_cowrie(args.cowrie_log, load_session_map(args.session_map), sessions)
+
+  started = time.time()
+  results = replay(sessions, (args.host, args.port), args.concurrency, args.speed, args.timeout, not args.no_think)
+  report = summarize(sessions, results, time.time() - started, args.speed, backend)
+
+  text = json.dumps(report, indent=2)
+  print(text)
+  if args.output:
+    with open(args.output, "w", encoding="utf-8") as f:
+      f.write(text + "\n")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,67 @@
+from array import array
+import heapq
+
+class SpaceSaving:
+  def __init__(self, capacity: int = 128):
+    self.capacity = capacity
+    self.counts = {}
+    self.errors = {}
+    self.heap = []
+
+  def add(self, key: str, count: int = 1):
+    counts = self.counts
+    if key in counts:
+      counts[key] += count
+      return
+
+    heap = self.heap
+    if len(counts) < self.capacity:
+      counts[key] = count
+      self.errors[key] = 0
+      heapq.heappush(heap, (count, key))
+      return
+
+    while True:
+      floor, victim = heap[0]
+      current = counts[victim]
+      if current == floor:
+        break
+      heapq.heapreplace(heap, (current, victim))
+
+    heapq.heapreplace(heap, (floor + count, key))
+    del counts[victim]
+    del self.errors[victim]
+    counts[key] = floor + count
+    self.errors[key] = floor
+
+  def items(self):
+    for key, count in self.counts.items():
+      yield key, count, self.errors[key]
+
+  def clear(self):
+    self.counts.clear()
+    self.errors.clear()
+    self.heap.clear()
+
+class CountMinSketch:
+  def __init__(self, width: int = 1024, depth: int = 4):
+    self.width = width
+    self.depth = depth
+    self.rows = self._empty_rows()
+
+  def _empty_rows(self):
+    return [array("I", bytes(4 * self.width)) for _ in range(self.depth)]
+
+  def _indexes(self, key: str):
+    width = self.width
+    return [hash((seed, key)) % width for seed in range(self.depth)]
+
+  def add(self, key: str, count: int = 1):
+    for row, index in zip(self.rows, self._indexes(key)):
+      row[index] += count
+
+  def estimate(self, key: str) -> int:
+    return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+  def clear(self):
+    self.rows = self._empty_rows()
@@ -0,0 +1,166 @@
+from analytics import sketches
+from utils import log_event
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("username", "password", "src_ip", "command")
+
+WINDOWS = {
+  "1m": 60,
+  "5m": 300,
+  "15m": 900,
+  "1h": 3600,
+}
+
+BUCKET_SECONDS = 60
+SUMMARY_CAPACITY = int(os.getenv("ANALYTICS_SUMMARY_CAPACITY", "128"))
+SNAPSHOT_INTERVAL = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "60"))
+SNAPSHOT_WINDOW = os.getenv("ANALYTICS_SNAPSHOT_WINDOW", "5m")
+SNAPSHOT_TOP_N = int(os.getenv("ANALYTICS_SNAPSHOT_TOP_N", "10"))
+
+class _Bucket:
+  def __init__(self, capacity: int):
+    self.epoch = -1
+    self.total = {dimension: 0 for dimension in DIMENSIONS}
+    self.summaries = {dimension: sketches.SpaceSaving(capacity) for dimension in DIMENSIONS}
+    self.counters = {dimension: sketches.CountMinSketch() for dimension in DIMENSIONS}
+
+  def reset(self, epoch: int):
+    self.epoch = epoch
+    for dimension in DIMENSIONS:
+      self.total[dimension] = 0
+      self.summaries[dimension].clear()
+      self.counters[dimension].clear()
+
+class StreamAnalytics:
+  def __init__(self, capacity: int = SUMMARY_CAPACITY, bucket_seconds: int = BUCKET_SECONDS):
+    self.bucket_seconds = bucket_seconds
+    span = max(WINDOWS.values())
+    self.buckets = [_Bucket(capacity) for _ in range(span // bucket_seconds + 1)]
+    self.lock = threading.Lock()
+
+  def _current_bucket(self, now: float) -> _Bucket:
+    epoch = int(now // self.bucket_seconds)
+    bucket = self.buckets[epoch % len(self.buckets)]
+    if bucket.epoch != epoch:
+      bucket.reset(epoch)
+    return bucket
+
+  def _live_buckets(self, window_seconds: int, now: float):
+    epoch = int(now // self.bucket_seconds)
+    start = now - window_seconds
+    live = []
+    for bucket in self.buckets:
+      if bucket.epoch < 0 or bucket.epoch > epoch:
+        continue
+      weight = min(1.0, ((bucket.epoch + 1) * self.bucket_seconds - start) / self.bucket_seconds)
+      if weight > 0:
+        live.append((bucket, weight))
+    return live
+
+  def record(self, dimension: str, key, now: float = None):
+    if key is None or dimension not in DIMENSIONS:
+      return
+    key = str(key)
+    now = time.time() if now is None else now
+
+    with self.lock:
+      bucket = self._current_bucket(now)
+      bucket.total[dimension] += 1
+      bucket.summaries[dimension].add(key)
+      bucket.counters[dimension].add(key)
+
+  def top(self, dimension: str, window: str = "5m", n: int = 10, now: float = None) -> list:
+    window_seconds = WINDOWS[window]
+    now = time.time() if now is None else now
+    merged = {}
+
+    with self.lock:
+      for bucket, weight in self._live_buckets(window_seconds, now):
+        for key, count, error in bucket.summaries[dimension].items():
+          entry = merged.setdefault(key, [0.0, 0.0])
+          entry[0] += count * weight
+          entry[1] += error * weight
+
+    ranked = sorted(merged.items(), key=lambda item: item[1][0], reverse=True)[:n]
+    return [{"key": key, "count": round(count), "error": round(error)} for key, (count, error) in ranked]
+
+  def estimate(self, dimension: str, key, window: str = "5m", now: float = None) -> int:
+    window_seconds = WINDOWS[window]
+    now = time.time() if now is None else now
+
+    with self.lock:
+      return round(sum(
+        bucket.counters[dimension].estimate(str(key)) * weight
+        for bucket, weight in self._live_buckets(window_seconds, now)
+      ))
+
+  def total(self, dimension: str, window: str = "5m", now: float = None) -> int:
+    window_seconds = WINDOWS[window]
+    now = time.time() if now is None else now
+
+    with self.lock:
+      return round(sum(bucket.total[dimension] * weight for bucket, weight in self._live_buckets(window_seconds, now)))
+
+  def snapshot(self, window: str = "5m", n: int = 10) -> dict:
+    now = time.time()
+    return {
+      "window": window,
+      "totals": {dimension: self.total(dimension, window, now) for dimension in DIMENSIONS},
+      "top": {dimension: self.top(dimension, window, n, now) for dimension in DIMENSIONS},
+    }
+
+STATS = StreamAnalytics()
+
+def record_auth(src_ip, username, password):
+  try:
+    STATS.record("src_ip", src_ip)
+    STATS.record("username", username)
+    STATS.record("password", password)
+  except Exception:
+    logger.exception("Failed to record auth analytics")
+
+def record_command(command):
+  try:
+    STATS.record("command", command)
+  except Exception:
+    logger.exception("Failed to record command analytics")
+
+def handle_top(query: dict) -> dict:
+  window = query.get("window", "5m")
+  if window not in WINDOWS:
+    raise ValueError(f"Unknown window: {window}")
+  n = int(query.get("n", "10"))
+
+  dimension = query.get("dimension")
+  if dimension:
+    if dimension not in DIMENSIONS:
+      raise ValueError(f"Unknown dimension: {dimension}")
+    return {"window": window, "top": {dimension: STATS.top(dimension, window, n)}}
+
+  return STATS.snapshot(window, n)
+
+def handle_estimate(query: dict) -> dict:
+  window = query.get("window", "5m")
+  dimension = query.get("dimension", "")
+  if window not in WINDOWS or dimension not in DIMENSIONS:
+    raise ValueError("window and dimension are required")
+  key = query.get("key", "")
+  return {"window": window, "dimension": dimension, "key": key, "estimate": STATS.estimate(dimension, key, window)}
+
+def _snapshot_loop(interval: float):
+  while True:
+    time.sleep(interval)
+    try:
+      log_event.log_analytics_snapshot(STATS.snapshot(SNAPSHOT_WINDOW, SNAPSHOT_TOP_N))
+    except Exception:
+      logger.exception("Failed to emit analytics snapshot")
+
+def start_snapshot_loop(interval: float = SNAPSHOT_INTERVAL):
+  if interval <= 0 or SNAPSHOT_WINDOW not in WINDOWS:
+    return
+  threading.Thread(target=_snapshot_loop, args=(interval,), name="analytics-snapshot", daemon=True).start()
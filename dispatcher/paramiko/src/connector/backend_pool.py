@@ -0,0 +1,166 @@
+from collections import deque
+from concurrent.futures import Future
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_EXEC = 1
+PRIORITY_SPECULATIVE = 2
+PRIORITY_NAMES = {
+  PRIORITY_INTERACTIVE: "interactive",
+  PRIORITY_EXEC: "exec",
+  PRIORITY_SPECULATIVE: "speculative",
+}
+
+LANES = (
+  ("cowrie", int(os.getenv("BACKEND_COWRIE_WORKERS", "32")), int(os.getenv("BACKEND_COWRIE_QUEUE", "256"))),
+  ("cowrie_tab", int(os.getenv("BACKEND_TAB_WORKERS", "8")), int(os.getenv("BACKEND_TAB_QUEUE", "32"))),
+  ("heralding", int(os.getenv("BACKEND_HERALDING_WORKERS", "8")), int(os.getenv("BACKEND_HERALDING_QUEUE", "512"))),
+  ("exec", int(os.getenv("BACKEND_EXEC_WORKERS", "32")), int(os.getenv("BACKEND_EXEC_QUEUE", "256"))),
+)
+MAX_WAIT = float(os.getenv("BACKEND_MAX_WAIT", "30"))
+SAMPLE_SIZE = 1024
+
+class BackendBusy(Exception):
+  pass
+
+class _Job:
+  def __init__(self, func, args, kwargs, priority: int):
+    self.func = func
+    self.args = args
+    self.kwargs = kwargs
+    self.priority = priority
+    self.enqueued = time.time()
+    self.future = Future()
+
+def _fail(job: _Job, error: Exception):
+  if job.future.set_running_or_notify_cancel():
+    job.future.set_exception(error)
+
+class Lane:
+  def __init__(self, name: str, workers: int, max_queue: int, max_wait: float = MAX_WAIT):
+    self.name = name
+    self.workers = workers
+    self.max_queue = max_queue
+    self.max_wait = max_wait
+    self.queue = []
+    self.sequence = itertools.count()
+    self.condition = threading.Condition()
+    self.busy = 0
+    self.counts = {"submitted": 0, "completed": 0, "failed": 0, "shed": 0, "evicted": 0, "expired": 0}
+    self.by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+    self.waits = deque(maxlen=SAMPLE_SIZE)
+    self.threads = []
+
+  def _start_workers(self):
+    for index in range(self.workers):
+      thread = threading.Thread(target=self._work, name=f"backend-{self.name}-{index}", daemon=True)
+      thread.start()
+      self.threads.append(thread)
+
+  def submit(self, func, args, kwargs, priority: int) -> Future:
+    job = _Job(func, args, kwargs, priority)
+    evicted = None
+
+    with self.condition:
+      if not self.threads:
+        self._start_workers()
+      if len(self.queue) >= self.max_queue:
+        lowest = max(self.queue)
+        if lowest[0] <= priority:
+          self.counts["shed"] += 1
+          raise BackendBusy(f"{self.name} queue full ({len(self.queue)})")
+        self.queue.remove(lowest)
+        heapq.heapify(self.queue)
+        evicted = lowest[2]
+        self.counts["evicted"] += 1
+
+      heapq.heappush(self.queue, (priority, next(self.sequence), job))
+      self.counts["submitted"] += 1
+      label = PRIORITY_NAMES.get(priority, str(priority))
+      self.by_priority[label] = self.by_priority.get(label, 0) + 1
+      self.condition.notify()
+
+    if evicted is not None:
+      _fail(evicted, BackendBusy(f"{self.name} job evicted by higher priority work"))
+    return job.future
+
+  def _work(self):
+    while True:
+      with self.condition:
+        while not self.queue:
+          self.condition.wait()
+        _, _, job = heapq.heappop(self.queue)
+        waited = time.time() - job.enqueued
+        self.waits.append(waited)
+        if waited > self.max_wait:
+          self.counts["expired"] += 1
+          expired = True
+        else:
+          self.busy += 1
+          expired = False
+
+      if expired:
+        _fail(job, BackendBusy(f"{self.name} job waited {waited:.1f}s"))
+        continue
+
+      if not job.future.set_running_or_notify_cancel():
+        with self.condition:
+          self.busy -= 1
+        continue
+
+      try:
+        result = job.func(*job.args, **job.kwargs)
+      except BaseException as e:
+        with self.condition:
+          self.counts["failed"] += 1
+          self.busy -= 1
+        job.future.set_exception(e)
+      else:
+        with self.condition:
+          self.counts["completed"] += 1
+          self.busy -= 1
+        job.future.set_result(result)
+
+  def metrics(self) -> dict:
+    with self.condition:
+      waits = sorted(self.waits)
+      stats = dict(self.counts)
+      stats.update({
+        "workers": self.workers,
+        "busy": self.busy,
+        "queue_depth": len(self.queue),
+        "max_queue": self.max_queue,
+        "by_priority": dict(self.by_priority),
+      })
+
+    if waits:
+      pick = lambda q: waits[min(len(waits) - 1, int(q * len(waits)))]
+      stats["wait_ms"] = {
+        "p50": round(pick(0.50) * 1000, 2),
+        "p90": round(pick(0.90) * 1000, 2),
+        "p99": round(pick(0.99) * 1000, 2),
+        "max": round(waits[-1] * 1000, 2),
+      }
+    return stats
+
+class BackendExecutor:
+  def __init__(self, lanes=LANES):
+    self.lanes = {name: Lane(name, workers, max_queue) for name, workers, max_queue in lanes}
+
+  def submit(self, lane: str, func, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Future:
+    return self.lanes[lane].submit(func, args, kwargs, priority)
+
+  def run(self, lane: str, func, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+    return self.submit(lane, func, *args, priority=priority, **kwargs).result()
+
+  def metrics(self, query: dict = None) -> dict:
+    return {name: lane.metrics() for name, lane in self.lanes.items()}
+
+EXECUTOR = BackendExecutor()
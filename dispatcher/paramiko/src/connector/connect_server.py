@@ -1,12 +1,37 @@
-from utils import ansi_sequences, resource_manager
+from connector import backend_pool
+from utils import ansi_sequences, diagnostics, log_event, resource_manager
 import logging
+import os
 import paramiko
 import re
 import socket
+import threading
 import time
 
 logger = logging.getLogger(__name__)
 
+SESSION_SHELL_WAIT = float(os.getenv("SESSION_SHELL_WAIT", "15"))
+CLIENT_VERSION_PREFIX = "SSH-2.0-YozakuraDispatcher_"
+PROMPT_TAIL_RE = re.compile(r"@[^\s:]+:[^\r\n]*[#$] $")
+
+def _prompt_tail(output: bytes) -> bytes | None:
+  tail = output.rsplit(b"\n", 1)[-1]
+  text = ansi_sequences.strip_ansi_sequences(tail.decode("utf-8", errors="ignore")).lstrip("\r")
+  return tail if PROMPT_TAIL_RE.search(text) else None
+
+def _transport_factory(purpose: str):
+  def factory(sock, **kwargs):
+    transport = paramiko.Transport(sock, **kwargs)
+    transport.local_version = CLIENT_VERSION_PREFIX + purpose
+    return transport
+  return factory
+
+def _close_future_shell(future):
+  try:
+    future.result().close()
+  except Exception:
+    pass
+
 def fetch_server_version(host: str, port: int = 2222, timeout: float = 5.0) -> str:
   sock = None
   try:
@@ -38,11 +63,59 @@ def fetch_server_version(host: str, port: int = 2222, timeout: float = 5.0) -> s
       except Exception:
         pass
 
+class BackendShell:
+  def __init__(self, client, transport, shell, username: str):
+    self.client = client
+    self.transport = transport
+    self.shell = shell
+    self.username = username
+    self.created = time.time()
+
+  def alive(self) -> bool:
+    return self.transport.is_active() and not self.shell.closed
+
+  def drain(self):
+    try:
+      while self.shell.recv_ready():
+        self.shell.recv(4096)
+    except Exception:
+      pass
+
+  def close(self):
+    resource_manager.close_ssh_connection(client=self.client, shell=self.shell, transport=self.transport)
+
 class SSHConnector:
-  def __init__(self, host: str, port: int = 22):
+  def __init__(self, host: str, port: int = 22, session_id: str = None):
     self.host = host
     self.port = port
-    self.shell = None
+    self.session_id = session_id
+    self.session_shell = None
+    self.pending_shell = None
+    self.shell_lock = threading.Lock()
+
+  def _open_client(self, username: str, password: str, purpose: str):
+    sock = socket.create_connection((self.host, self.port), timeout=10)
+    self._record_backend_session(sock, purpose)
+
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    try:
+      client.connect(self.host, port=self.port, username=username, password=password, timeout=10, sock=sock,
+                     transport_factory=_transport_factory(purpose))
+    except Exception:
+      resource_manager.close_client(client)
+      resource_manager.close_socket(sock)
+      raise
+    return client, client.get_transport()
+
+  def _record_backend_session(self, sock, purpose: str):
+    if self.session_id is None:
+      return
+    try:
+      local_ip, local_port = sock.getsockname()[:2]
+      log_event.log_backend_session(self.session_id, self.host, self.port, local_ip, local_port, purpose)
+    except Exception:
+      logger.exception("Failed to record backend session mapping")
 
   def record_login(self, username: str, password: str):
     client = None
@@ -50,10 +123,7 @@ class SSHConnector:
     transport = None
 
     try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
+      client, transport = self._open_client(username, password, "login")
 
       try:
         shell = client.invoke_shell()
@@ -68,44 +138,83 @@ class SSHConnector:
     finally:
       resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
 
-  def flush_buffer(self, timeout: float = 0.2):
-    if not self.shell:
-      return
-    end = time.time() + timeout
+  def open_shell(self, username: str, password: str, purpose: str = "session") -> BackendShell:
+    client, transport = self._open_client(username, password, purpose)
+    shell = None
+    try:
+      shell = client.invoke_shell()
+      shell.settimeout(5)
+      self._wait_for_prompt(shell)
+    except Exception:
+      resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
+      raise
+    return BackendShell(client, transport, shell, username)
+
+  def attach_shell(self, backend_shell: BackendShell):
+    backend_shell.drain()
+    self._record_backend_session(backend_shell.transport.sock, "warm")
+    with self.shell_lock:
+      self.session_shell = backend_shell
 
+  def open_session_shell(self, username: str, password: str):
     try:
-      while time.time() < end:
-        if self.shell.recv_ready():
-          _ = self.shell.recv(4096)
+      self.pending_shell = backend_pool.EXECUTOR.submit("cowrie", self.open_shell, username, password)
+    except backend_pool.BackendBusy:
+      logger.debug("Cowrie queue full, session %s falls back to per-command connections", self.session_id)
 
-        else:
-          time.sleep(0.02)
+  def has_session_shell(self) -> bool:
+    return self.pending_shell is not None or self.session_shell is not None
 
-    except Exception:
-      pass
+  def _current_shell(self):
+    pending, self.pending_shell = self.pending_shell, None
+    if pending is not None:
+      try:
+        backend_shell = pending.result(timeout=SESSION_SHELL_WAIT)
+      except Exception:
+        logger.warning("Session shell for %s unavailable, using per-command connections", self.session_id)
+        pending.add_done_callback(_close_future_shell)
+      else:
+        with self.shell_lock:
+          self.session_shell = backend_shell
+
+    with self.shell_lock:
+      backend_shell = self.session_shell
+    if backend_shell is not None and not backend_shell.alive():
+      self.release_shell()
+      return None
+    return backend_shell
+
+  def release_shell(self):
+    with self.shell_lock:
+      backend_shell, self.session_shell = self.session_shell, None
+    pending, self.pending_shell = self.pending_shell, None
+    if pending is not None:
+      pending.add_done_callback(_close_future_shell)
+    if backend_shell is not None:
+      backend_shell.close()
+
+  @diagnostics.timed("execute_command")
+  def execute_command(self, command: str, username: str, password: str, preamble: str = "", purpose: str = "command"):
+    if purpose == "command":
+      backend_shell = self._current_shell()
+      if backend_shell is not None:
+        return self._execute_on_shell(backend_shell, command)
 
-  def execute_command(self, command: str, username: str, password: str, dir_cmd=None):
     client = None
     shell = None
     transport = None
 
     try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
+      client, transport = self._open_client(username, password, purpose)
 
       shell = client.invoke_shell()
       shell.settimeout(5)
 
       self._wait_for_prompt(shell)
 
-      if dir_cmd:
-        shell.send(dir_cmd + "\n")
-        self._wait_for_prompt(shell)
-
-      shell.send(command + "\n")
-      output, cwd = self._receive_until_prompt(shell, command)
+      line = f"{preamble}; {command}" if preamble else command
+      shell.send(line + "\n")
+      output, cwd = self._receive_until_prompt(shell, line)
 
       return output, cwd
 
@@ -116,58 +225,38 @@ class SSHConnector:
     finally:
       resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
 
+  def _execute_on_shell(self, backend_shell: BackendShell, command: str):
+    try:
+      backend_shell.drain()
+      backend_shell.shell.send(command + "\n")
+      return self._receive_until_prompt(backend_shell.shell, command)
+    except Exception:
+      logger.warning("Session shell for %s failed, closing it", self.session_id)
+      self.release_shell()
+      raise
+
+  def execute_with_tab(self, preamble: str, command: str, username: str, password: str):
+    backend_shell = self._current_shell()
+    if backend_shell is not None:
+      return self._tab_on_shell(backend_shell, command)
 
-  def execute_with_tab(self, cwd, command: str, username: str, password: str):
     client = None
     shell = None
     transport = None
 
     try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
+      client, transport = self._open_client(username, password, "tab")
 
       shell = client.invoke_shell()
       shell.settimeout(5)
 
       self._wait_for_prompt(shell)
 
-      shell.send(f"cd {cwd}\n")
-      self._wait_for_prompt(shell)
-
-      raw_command = command.replace("\t", "")
-      shell.send(raw_command + "\t")
-      time.sleep(0.2)
-
-      output = b""
-      start_time = time.time()
-      timeout = 1
-
-      while True:
-        try:
-          if shell.recv_ready():
-            chunk = shell.recv(1024)
-            output += chunk
-            decoded = output.decode("utf-8", errors="ignore")
-            cleaned = ansi_sequences.strip_ansi_sequences(decoded)
-
-            if raw_command in cleaned:
-              index = cleaned.rfind(raw_command)
-              if index != -1 and len(cleaned) > index + len(raw_command):
-                break
-
-          if time.time() - start_time > timeout:
-            break
-          time.sleep(0.05)
-
-        except Exception:
-          logger.exception("Error while receiving TAB completion output")
-          break
+      if preamble:
+        shell.send(preamble + "\n")
+        self._wait_for_prompt(shell)
 
-      output_chars = output.decode("utf-8", errors="ignore")
-
-      return command, output_chars
+      return command, self._complete(shell, command.replace("\t", ""))
 
     except Exception:
       logger.exception("Error in execute_with_tab")
@@ -176,16 +265,57 @@ class SSHConnector:
     finally:
       resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
 
+  def _tab_on_shell(self, backend_shell: BackendShell, command: str):
+    try:
+      backend_shell.drain()
+      output_chars = self._complete(backend_shell.shell, command.replace("\t", ""))
+      backend_shell.shell.send("\x03")
+      self._wait_for_prompt(backend_shell.shell)
+      return command, output_chars
+    except Exception:
+      logger.warning("Session shell for %s failed during TAB completion, closing it", self.session_id)
+      self.release_shell()
+      return "", ""
+
+  def _complete(self, shell, raw_command: str) -> str:
+    shell.send(raw_command + "\t")
+    time.sleep(0.2)
+
+    output = b""
+    start_time = time.time()
+    timeout = 1
+
+    while True:
+      try:
+        if shell.recv_ready():
+          chunk = shell.recv(1024)
+          output += chunk
+          decoded = output.decode("utf-8", errors="ignore")
+          cleaned = ansi_sequences.strip_ansi_sequences(decoded)
+
+          if raw_command in cleaned:
+            index = cleaned.rfind(raw_command)
+            if index != -1 and len(cleaned) > index + len(raw_command):
+              break
+
+        if time.time() - start_time > timeout:
+          break
+        time.sleep(0.05)
+
+      except Exception:
+        logger.exception("Error while receiving TAB completion output")
+        break
+
+    return output.decode("utf-8", errors="ignore")
+
+  @diagnostics.timed("execute_command_via_shell")
   def execute_command_via_shell(self, command: str, username: str, password: str):
     client = None
     shell = None
     transport = None
 
     try:
-      client = paramiko.SSHClient()
-      client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-      client.connect(self.host, port=self.port, username=username, password=password, timeout=10)
-      transport = client.get_transport()
+      client, transport = self._open_client(username, password, "exec")
 
       shell = client.invoke_shell()
       shell.settimeout(5)
@@ -262,6 +392,7 @@ class SSHConnector:
       resource_manager.close_ssh_connection(client=client, shell=shell, transport=transport)
 
   def _wait_for_prompt(self, shell):
+    output = b""
     try:
       while True:
         data = shell.recv(1024)
@@ -269,7 +400,8 @@ class SSHConnector:
         if not data:
           break
 
-        if b"$ " in data or b"# " in data:
+        output += data
+        if _prompt_tail(output) is not None:
           break
 
     except Exception:
@@ -279,6 +411,7 @@ class SSHConnector:
   def _receive_until_prompt(self, shell, sent_cmd: str = "") -> tuple[str, str]:
     output = b""
     prompt_line = b""
+    prompt_str = ""
 
     try:
       while True:
@@ -286,8 +419,9 @@ class SSHConnector:
         if not data:
           break
         output += data
-        if b"$ " in data or b"# " in data:
-          prompt_line = data
+        tail = _prompt_tail(output)
+        if tail is not None:
+          prompt_line = tail
           break
     except Exception:
       logger.exception("Error in _receive_until_prompt")
@@ -312,7 +446,7 @@ class SSHConnector:
 
     output_lines = b"\n".join(cleaned_lines).decode("utf-8", errors="ignore")
 
-    cwd = "~"
+    cwd = None
     match = re.search(r"@[^:]+:(.*?)[\$#] ?", prompt_str)
     if match:
       cwd = match.group(1).strip()
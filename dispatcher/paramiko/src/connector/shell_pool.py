@@ -0,0 +1,178 @@
+from collections import Counter, deque
+from connector import backend_pool, connect_server
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTS_FILE = "./config/warm_shells.txt"
+WARM_SHELLS_ENABLED = os.getenv("WARM_SHELLS", "yes").lower() in ("1", "yes", "true")
+MIN_SIZE = int(os.getenv("WARM_SHELLS_MIN", "1"))
+MAX_SIZE = int(os.getenv("WARM_SHELLS_MAX", "16"))
+RATE_WINDOW = float(os.getenv("WARM_SHELLS_RATE_WINDOW", "300"))
+MAX_AGE = float(os.getenv("WARM_SHELLS_MAX_AGE", "150"))
+MAINTAIN_INTERVAL = float(os.getenv("WARM_SHELLS_INTERVAL", "5"))
+WARMUP_ALPHA = 0.2
+
+def load_accounts(path: str = ACCOUNTS_FILE) -> dict:
+  accounts = {}
+  try:
+    with open(path, "r", encoding="utf-8") as f:
+      for line in f:
+        line = line.strip()
+        if not line or line.startswith("#"):
+          continue
+        username, sep, password = line.partition(":")
+        if not sep or not username:
+          logger.warning("Ignoring malformed warm shell entry: %s", line)
+          continue
+        accounts[username] = password
+  except FileNotFoundError:
+    logger.warning("Warm shell accounts '%s' not found.", path)
+  return accounts
+
+class WarmShellPool:
+  def __init__(self, host: str = "cowrie", port: int = 2222, accounts: dict = None,
+               min_size: int = MIN_SIZE, max_size: int = MAX_SIZE):
+    self.connector = connect_server.SSHConnector(host, port)
+    self.accounts = load_accounts() if accounts is None else accounts
+    self.min_size = min_size
+    self.max_size = max_size
+    self.lock = threading.Lock()
+    self.idle = {username: deque() for username in self.accounts}
+    self.pending = Counter()
+    self.arrivals = {username: deque() for username in self.accounts}
+    self.counts = {username: Counter() for username in self.accounts}
+    self.warmup_seconds = 2.0
+    self.thread = None
+
+  def target(self, username: str, now: float = None) -> int:
+    now = time.time() if now is None else now
+    arrivals = self.arrivals[username]
+    while arrivals and arrivals[0] < now - RATE_WINDOW:
+      arrivals.popleft()
+    rate = len(arrivals) / RATE_WINDOW
+    demand = math.ceil(rate * (self.warmup_seconds + MAINTAIN_INTERVAL))
+    return max(self.min_size, min(self.max_size, demand))
+
+  def acquire(self, username: str):
+    if not WARM_SHELLS_ENABLED or username not in self.accounts:
+      return None
+
+    now = time.time()
+    stale = []
+    backend_shell = None
+    with self.lock:
+      self.arrivals[username].append(now)
+      idle = self.idle[username]
+      while idle:
+        candidate = idle.popleft()
+        if now - candidate.created < MAX_AGE and candidate.alive():
+          backend_shell = candidate
+          break
+        stale.append(candidate)
+      self.counts[username]["hits" if backend_shell else "misses"] += 1
+      self.counts[username]["expired"] += len(stale)
+
+    for candidate in stale:
+      candidate.close()
+    self._replenish(username)
+    return backend_shell
+
+  def _replenish(self, username: str):
+    with self.lock:
+      missing = self.target(username) - len(self.idle[username]) - self.pending[username]
+      if missing <= 0:
+        return
+      self.pending[username] += missing
+
+    for launched in range(missing):
+      try:
+        backend_pool.EXECUTOR.submit("cowrie", self._create, username, priority=backend_pool.PRIORITY_SPECULATIVE)
+      except backend_pool.BackendBusy:
+        with self.lock:
+          self.pending[username] -= missing - launched
+          self.counts[username]["shed"] += 1
+        return
+
+  def _create(self, username: str):
+    started = time.time()
+    backend_shell = None
+    try:
+      backend_shell = self.connector.open_shell(username, self.accounts[username], "warm")
+    except Exception:
+      logger.debug("Failed to warm a Cowrie shell for %s", username)
+    finally:
+      with self.lock:
+        self.pending[username] -= 1
+        if backend_shell is None:
+          self.counts[username]["failed"] += 1
+        else:
+          elapsed = time.time() - started
+          self.warmup_seconds += WARMUP_ALPHA * (elapsed - self.warmup_seconds)
+          self.counts[username]["created"] += 1
+          if len(self.idle[username]) < self.max_size:
+            self.idle[username].append(backend_shell)
+            backend_shell = None
+          else:
+            self.counts[username]["discarded"] += 1
+    if backend_shell is not None:
+      backend_shell.close()
+
+  def _expire(self):
+    now = time.time()
+    stale = []
+    with self.lock:
+      for username, idle in self.idle.items():
+        keep = self.target(username, now)
+        fresh = deque()
+        for backend_shell in idle:
+          if now - backend_shell.created < MAX_AGE and backend_shell.alive() and len(fresh) < keep:
+            fresh.append(backend_shell)
+          else:
+            stale.append(backend_shell)
+            self.counts[username]["expired"] += 1
+        self.idle[username] = fresh
+
+    for backend_shell in stale:
+      backend_shell.close()
+
+  def _maintain(self):
+    while True:
+      try:
+        self._expire()
+        for username in self.accounts:
+          self._replenish(username)
+      except Exception:
+        logger.exception("Warm shell maintenance failed")
+      time.sleep(MAINTAIN_INTERVAL)
+
+  def start(self):
+    if not WARM_SHELLS_ENABLED or not self.accounts or self.thread is not None:
+      return
+    self.thread = threading.Thread(target=self._maintain, name="warm-shells", daemon=True)
+    self.thread.start()
+
+  def metrics(self, query: dict = None) -> dict:
+    with self.lock:
+      users = {}
+      for username in self.accounts:
+        counts = self.counts[username]
+        taken = counts.get("hits", 0) + counts.get("misses", 0)
+        users[username] = dict(
+          counts,
+          idle=len(self.idle[username]),
+          pending=self.pending[username],
+          target=self.target(username),
+          hit_rate=round(counts.get("hits", 0) / taken, 4) if taken else 0.0,
+        )
+      return {
+        "enabled": WARM_SHELLS_ENABLED,
+        "warmup_ms": round(self.warmup_seconds * 1000, 1),
+        "users": users,
+      }
+
+POOL = WarmShellPool()
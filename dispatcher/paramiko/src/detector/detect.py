@@ -1,10 +1,130 @@
-class AttackDetector:
-  def __init__(self):
-    self.failed_attempts = 0
-
-  def check(self, username, password, command):
-    if username == "root" and password == "1234":
-      return True
-    if "wget" in command or "curl" in command:
-      return True
-    return False
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_FILE = "./config/signatures.txt"
+
+class AhoCorasick:
+  def __init__(self, patterns):
+    self.goto = [{}]
+    self.fail = [0]
+    self.out = [()]
+
+    for pattern, payload in patterns:
+      self._insert(pattern, payload)
+    self._build()
+
+  def _insert(self, pattern: str, payload):
+    node = 0
+    for ch in pattern:
+      nxt = self.goto[node].get(ch)
+      if nxt is None:
+        nxt = len(self.goto)
+        self.goto[node][ch] = nxt
+        self.goto.append({})
+        self.fail.append(0)
+        self.out.append(())
+      node = nxt
+    self.out[node] = self.out[node] + (payload,)
+
+  def _build(self):
+    queue = list(self.goto[0].values())
+    for node in queue:
+      for ch, child in self.goto[node].items():
+        queue.append(child)
+        state = self.fail[node]
+        while state and ch not in self.goto[state]:
+          state = self.fail[state]
+        target = self.goto[state].get(ch, 0)
+        self.fail[child] = target if target != child else 0
+        self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    # Resolve failure links ahead of time so search() is a single dict lookup per character.
+    self.delta = [dict(self.goto[0])]
+    self.delta.extend({} for _ in range(len(self.goto) - 1))
+    for node in queue:
+      transitions = dict(self.delta[self.fail[node]])
+      transitions.update(self.goto[node])
+      self.delta[node] = transitions
+
+  def search(self, text: str) -> set:
+    delta = self.delta
+    out = self.out
+    node = 0
+    found = set()
+
+    for ch in text:
+      node = delta[node].get(ch, 0)
+      if out[node]:
+        found.update(out[node])
+
+    return found
+
+def load_signatures(path: str = SIGNATURE_FILE):
+  literals = []
+  regexes = []
+
+  try:
+    with open(path, "r", encoding="utf-8") as f:
+      for line in f:
+        line = line.rstrip("\n")
+        if not line.strip() or line.startswith("#") or ":" not in line:
+          continue
+        category, rule = line.split(":", 1)
+        if rule.startswith("re:"):
+          regexes.append((category.strip(), rule[3:]))
+        else:
+          literals.append((category.strip(), rule.lower()))
+  except FileNotFoundError:
+    logger.warning("Signature file '%s' not found.", path)
+
+  return literals, regexes
+
+class CommandClassifier:
+  def __init__(self, signature_file: str = SIGNATURE_FILE):
+    literals, regexes = load_signatures(signature_file)
+
+    self.automaton = AhoCorasick((pattern, category) for category, pattern in literals)
+
+    by_category = {}
+    for category, pattern in regexes:
+      try:
+        re.compile(pattern)
+      except re.error:
+        logger.warning("Invalid signature regex for %s: %s", category, pattern)
+        continue
+      by_category.setdefault(category, []).append(f"(?:{pattern})")
+
+    # One alternation per category: a shared alternation would let an earlier
+    # category's match consume a span another category also matches.
+    self.regexes = tuple(
+      (category, re.compile("|".join(patterns), re.IGNORECASE))
+      for category, patterns in by_category.items()
+    )
+    self.signature_count = len(literals) + sum(len(patterns) for patterns in by_category.values())
+
+  def classify(self, command: str) -> list:
+    if not command:
+      return []
+
+    categories = self.automaton.search(command.lower())
+
+    for category, regex in self.regexes:
+      if category not in categories and regex.search(command):
+        categories.add(category)
+
+    return sorted(categories)
+
+_classifier = None
+
+def classify(command: str) -> list:
+  global _classifier
+
+  try:
+    if _classifier is None:
+      _classifier = CommandClassifier()
+    return _classifier.classify(command)
+  except Exception:
+    logger.exception("Failed to classify command")
+    return []
@@ -1,13 +1,17 @@
+from analytics import stream_stats
 from auth import auth_user
-from connector import connect_server
-from session import handler
-from utils import log_event, resource_manager
+from concurrent.futures import CancelledError
+from connector import backend_pool, connect_server, shell_pool
+from detector import detect
+from session import handler, latency_shaper, prefetch, shell_state
+from utils import diagnostics, es_shipper, geoip, log_event, resource_manager, status_server
 from reader import line_reader
 import logging
 import socket
 import threading
 import paramiko
 import time
+import uuid
 
 logging.basicConfig(
   level=logging.WARNING,
@@ -27,25 +31,30 @@ class SSHProxyServer(paramiko.ServerInterface):
     self.event = threading.Event()
     self.username = None
     self.password = None
+    self.session_id = uuid.uuid4().hex[:12]
     self.authenticator = auth_user.Authenticator()
-    self.heralding_connector = connect_server.SSHConnector(host="heralding")
-    self.cowrie_connector = connect_server.SSHConnector(host="cowrie", port=2222)
+    self.heralding_connector = connect_server.SSHConnector(host="heralding", session_id=self.session_id)
+    self.cowrie_connector = connect_server.SSHConnector(host="cowrie", port=2222, session_id=self.session_id)
     self.client_addr = client_addr
     self.is_exec_request = False
     self.request_type = None
     self.exec_command = None
+    self.exec_future = None
+    self.exec_started = None
 
+  @diagnostics.timed("check_auth_password")
   def check_auth_password(self, username: str, password: str) -> int:
     self.username = username
     self.password = password
 
     try:
-      self.heralding_connector.record_login(username=username, password=password)
-    except Exception:
-      logger.exception("Failed to record login via heralding_connector")
+      backend_pool.EXECUTOR.submit("heralding", self.heralding_connector.record_login, username=username, password=password)
+    except backend_pool.BackendBusy:
+      logger.warning("Heralding mirror queue full, dropping login for %s", self.client_addr[0])
 
     auth_success = self.authenticator.authenticate(username, password)
-    log_event.log_auth_event(self.client_addr, HOST, PORT, username, password, auth_success)
+    stream_stats.record_auth(self.client_addr[0], username, password)
+    log_event.log_auth_event(self.client_addr, HOST, PORT, username, password, auth_success, self.session_id)
 
     return paramiko.AUTH_SUCCESSFUL if auth_success else paramiko.AUTH_FAILED
 
@@ -59,6 +68,12 @@ class SSHProxyServer(paramiko.ServerInterface):
 
   def check_channel_shell_request(self, channel) -> bool:
     self.request_type = "shell"
+    if not self.cowrie_connector.has_session_shell():
+      warm_shell = shell_pool.POOL.acquire(self.username)
+      if warm_shell is not None:
+        self.cowrie_connector.attach_shell(warm_shell)
+      else:
+        self.cowrie_connector.open_session_shell(self.username, self.password)
     self.event.set()
     return True
 
@@ -66,41 +81,66 @@ class SSHProxyServer(paramiko.ServerInterface):
     self.is_exec_request = True
     self.request_type = "exec"
     self.exec_command = command
-    self.event.set()
-    threading.Thread(
-      target=self._handle_exec_request,
-      args=(channel, command),
-      daemon=True
-    ).start()
-    return True
-
-  def _handle_exec_request(self, channel, command):
+    self.exec_started = time.time()
     try:
-      command_str = command.decode('utf-8', errors='ignore')
-
-      try:
-        src_ip, src_port = channel.getpeername()
-      except:
-        src_ip, src_port = "unknown", 0
+      self.exec_future = backend_pool.EXECUTOR.submit("exec", self._run_exec_request, channel, command, priority=backend_pool.PRIORITY_EXEC)
+    except backend_pool.BackendBusy:
+      logger.warning("Exec queue full, rejecting exec request from %s", self.client_addr[0])
+      return False
+    finally:
+      self.event.set()
+    return True
 
-      log_event.log_command_event(src_ip, src_port, self.username, command_str, "~")
+  def _run_exec_request(self, channel, command):
+    command_str = command.decode('utf-8', errors='ignore')
 
+    try:
+      src_ip, src_port = channel.getpeername()
+    except:
+      src_ip, src_port = "unknown", 0
+
+    classification = detect.classify(command_str)
+    log_event.log_command_event(src_ip, src_port, self.username, command_str, "~", self.session_id, classification)
+    stream_stats.record_command(command_str)
+    prefetch.MODEL.observe([], command_str)
+
+    backend_started = time.time()
+    output = backend_pool.EXECUTOR.run(
+      "cowrie",
+      self.cowrie_connector.execute_command_via_shell,
+      command_str,
+      self.username,
+      self.password,
+      priority=backend_pool.PRIORITY_EXEC
+    )
+    return command_str, output, time.time() - backend_started
+
+  def handle_exec_request(self, channel):
+    try:
       try:
-        output = self.cowrie_connector.execute_command_via_shell(
-          command_str,
-          self.username,
-          self.password
-        )
-        channel.send(output.encode('utf-8'))
-        channel.send_exit_status(0)
+        command_str, output, backend_seconds = self.exec_future.result()
+      except (CancelledError, backend_pool.BackendBusy):
+        logger.warning("Exec request from %s dropped before running", self.client_addr[0])
+        channel.send_exit_status(1)
+        return
       except Exception:
         logger.exception("Failed to execute command on cowrie")
         channel.send(b"Command execution failed.\n")
         channel.send_exit_status(1)
+        return
+
+      latency_shaper.SHAPER.hold(command_str, self.exec_started, backend_seconds, "exec")
+      channel.send(output.encode('utf-8'))
+      state = shell_state.ShellState(self.username)
+      state.confirm(None, output)
+      channel.send_exit_status(state.last_status)
 
     except Exception:
-      logger.exception("Error in _handle_exec_request")
-      channel.send_exit_status(1)
+      logger.exception("Error in handle_exec_request")
+      try:
+        channel.send_exit_status(1)
+      except Exception:
+        pass
     finally:
       try:
         reader = line_reader.LineReader(channel, self.username, self.password)
@@ -112,12 +152,14 @@ class SSHProxyServer(paramiko.ServerInterface):
 
 def _handle_client(client, addr):
   transport = None
+  server = None
   chan = None
   session_started = False
   try:
     logger.info("Connection from %s", addr)
 
     transport = paramiko.Transport(client)
+    transport.name = f"transport-{addr[0]}:{addr[1]}"
     transport.add_server_key(HOST_KEY)
 
     if COWRIE_VERSION:
@@ -134,7 +176,8 @@ def _handle_client(client, addr):
     server = SSHProxyServer(addr)
 
     try:
-      transport.start_server(server=server)
+      with diagnostics.span("start_server"):
+        transport.start_server(server=server)
     except paramiko.SSHException:
       logger.warning("SSH negotiation failed")
       return
@@ -157,6 +200,10 @@ def _handle_client(client, addr):
 
     if server.is_exec_request:
       session_started = True
+      if server.exec_future is not None:
+        server.handle_exec_request(chan)
+      else:
+        resource_manager.close_channel(chan)
       return
 
     username = server.username
@@ -165,7 +212,8 @@ def _handle_client(client, addr):
 
     threading.Thread(
       target=handler.handle_session,
-      args=(chan, username, password, addr, start_time, server.cowrie_connector),
+      args=(chan, username, password, addr, start_time, server.cowrie_connector, server.session_id),
+      name=f"session-{server.session_id}",
       daemon=True
     ).start()
 
@@ -177,6 +225,8 @@ def _handle_client(client, addr):
     logger.exception("Error accepting connection")
   finally:
     if not session_started:
+      if server is not None:
+        server.cowrie_connector.release_shell()
       try:
         if chan is not None:
           resource_manager.close_channel(chan)
@@ -191,6 +241,23 @@ def start_proxy():
   COWRIE_VERSION = connect_server.fetch_server_version("cowrie", 2222)
   logger.info("Using SSH version string: %s", COWRIE_VERSION)
 
+  status_server.register("/analytics/top", stream_stats.handle_top)
+  status_server.register("/analytics/estimate", stream_stats.handle_estimate)
+  status_server.register("/shipper/stats", es_shipper.metrics)
+  status_server.register("/prefetch/stats", prefetch.STATS.snapshot)
+  status_server.register("/shaper/stats", latency_shaper.SHAPER.metrics)
+  status_server.register("/backend/stats", backend_pool.EXECUTOR.metrics)
+  status_server.register("/warm/stats", shell_pool.POOL.metrics)
+  status_server.register("/geoip/stats", geoip.metrics)
+  status_server.register("/diag/threads", diagnostics.handle_threads)
+  status_server.register("/diag/profile", diagnostics.handle_profile)
+  status_server.register("/diag/spans", diagnostics.SPANS.snapshot)
+  status_server.start()
+  diagnostics.start()
+  shell_pool.POOL.start()
+  stream_stats.start_snapshot_loop()
+  es_shipper.start_from_env()
+
   sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
   sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
   sock.bind((HOST, PORT))
@@ -205,7 +272,7 @@ def start_proxy():
         logger.exception("Socket accept failed")
         continue
 
-      threading.Thread(target=_handle_client, args=(client, addr), daemon=True).start()
+      threading.Thread(target=_handle_client, args=(client, addr), name=f"conn-{addr[0]}:{addr[1]}", daemon=True).start()
   except Exception:
     logger.exception("Fatal error in accept loop")
   finally:
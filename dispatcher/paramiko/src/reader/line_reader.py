@@ -1,11 +1,11 @@
-from connector import connect_server
-from utils import ansi_sequences, extract_chars
+from connector import backend_pool, connect_server
+from utils import ansi_sequences, diagnostics, extract_chars
 import logging
 
 logger = logging.getLogger(__name__)
 
 class LineReader:
-  def __init__(self, chan, username, password, prompt="", history=[], cowrie_connector=None, cwd="~"):
+  def __init__(self, chan, username, password, prompt="", history=[], cowrie_connector=None, shell_state=None):
     self.chan = chan
     self.username = username
     self.password = password
@@ -17,15 +17,12 @@ class LineReader:
     self.history = history
     self.history_index = -1
     self.max_history_length = 1000
-    self.cwd = cwd
+    self.shell_state = shell_state
     self.cowrie_connector = cowrie_connector
 
   def update_prompt(self, new_prompt):
     self.prompt = new_prompt
 
-  def update_cwd(self, new_cwd):
-    self.cwd = new_cwd
-
   def send_prompt(self):
     self.chan.send(self.prompt.encode("utf-8"))
 
@@ -56,6 +53,7 @@ class LineReader:
     else:
       logger.debug("Invalid history index in LineReader.set_buffer_from_history")
 
+  @diagnostics.timed("handle_tab_completion")
   def handle_tab_completion(self):
     full_input = b"".join(self.buffer).decode("utf-8", errors="ignore")
     tokens = full_input.strip().split()
@@ -67,14 +65,20 @@ class LineReader:
     command_with_tab = full_input + "\t"
 
     connector = self.cowrie_connector or connect_server.SSHConnector(host="cowrie", port=2222)
-    cwd = self.cwd or "~"
-
-    command, output_chars = connector.execute_with_tab(
-      cwd,
-      command_with_tab,
-      self.username,
-      self.password
-    )
+    preamble = self.shell_state.preamble() if self.shell_state else ""
+
+    try:
+      command, output_chars = backend_pool.EXECUTOR.run(
+        "cowrie_tab",
+        connector.execute_with_tab,
+        preamble,
+        command_with_tab,
+        self.username,
+        self.password
+      )
+    except backend_pool.BackendBusy:
+      logger.debug("TAB completion shed, queue full")
+      return
 
     output_chars_clean = ansi_sequences.strip_ansi_sequences(output_chars)
     completed_command = extract_chars.get_completion_diff(command.strip(), output_chars_clean.strip())
@@ -1,32 +1,29 @@
-from session import set_prompt
+from analytics import stream_stats
+from connector import backend_pool
+from detector import detect
+from session import latency_shaper, prefetch, set_prompt, shell_state
 from reader import line_reader
-from utils import set_motd, ansi_sequences, log_event, resource_manager
+from utils import set_motd, ansi_sequences, log_event, resource_manager, session_recorder
 import logging
 import os
 import time
 
 logger = logging.getLogger(__name__)
 
-def _build_dir_cmd(cwd: str) -> str:
-  if not cwd or cwd == "~":
-    return ""
-  return f"cd {cwd}"
-
-def handle_session(chan, username, password, addr, start_time, cowrie_connector):
+def handle_session(chan, username, password, addr, start_time, cowrie_connector, session_id=None):
   history = []
-  dir_cmd = ""
+
+  recorder = session_recorder.open_recorder(session_id)
+  if recorder is not None:
+    chan = session_recorder.RecordingChannel(chan, recorder)
 
   hostname = str(os.getenv('HOST_NAME'))[:9]
-  cwd = "~"
+  state = shell_state.ShellState(username)
 
   prompt_manager = set_prompt.PromptManager()
-  prompt = prompt_manager.get_prompt(username, hostname, cwd)
-  reader = line_reader.LineReader(chan, username, password, prompt, history, cowrie_connector=cowrie_connector, cwd=cwd)
-
-  try:
-    cowrie_connector.flush_buffer(timeout=1.0)
-  except Exception:
-    pass
+  prompt = prompt_manager.get_prompt(username, hostname, state.display_cwd())
+  reader = line_reader.LineReader(chan, username, password, prompt, history, cowrie_connector=cowrie_connector, shell_state=state)
+  prefetcher = prefetch.SessionPrefetcher(cowrie_connector, username, password)
 
   motd_lines = set_motd.get_motd_lines(hostname)
   chan.send(b"\r\n")
@@ -35,40 +32,60 @@ def handle_session(chan, username, password, addr, start_time, cowrie_connector)
     chan.send(sent_line.encode("utf-8"))
     time.sleep(0.005)
 
+  prefetcher.speculate(state.preamble())
+
   try:
     while True:
       cmd = reader.read()
 
       if not cmd:
         continue
+      started = time.time()
 
       try:
         src_ip, src_port = chan.getpeername()
       except:
         src_ip, src_port = "unknown", 0
 
-      log_event.log_command_event(src_ip, src_port, username, cmd, cwd)
+      classification = detect.classify(cmd)
+      log_event.log_command_event(src_ip, src_port, username, cmd, state.display_cwd(), session_id, classification)
+      stream_stats.record_command(cmd)
+      prefetcher.record(cmd)
 
       if cmd.lower() in ["exit", "quit", "exit;", "quit;"]:
         break
 
-      dir_cmd = _build_dir_cmd(cwd)
-
+      preamble = state.preamble()
+      backend_cmd = state.expand_status(cmd)
+      source = "prefetch"
       try:
-        output, cwd = cowrie_connector.execute_command(cmd, username, password, dir_cmd)
+        backend_started = time.time()
+        result = prefetcher.take(backend_cmd, preamble)
+        if result is None:
+          source = "backend"
+          result = backend_pool.EXECUTOR.run("cowrie", cowrie_connector.execute_command, backend_cmd, username, password, preamble)
+        backend_seconds = time.time() - backend_started
+        output, backend_cwd = result
+      except backend_pool.BackendBusy:
+        logger.warning("Cowrie queue full, shedding command for session %s", session_id)
+        chan.send(b"-bash: fork: retry: Resource temporarily unavailable\r\n")
+        continue
       except Exception:
         logger.exception("Cowrie connection lost during command execution")
         chan.send(b"Connection to backend lost. Session terminated.\r\n")
         break
 
-      dir_cmd = _build_dir_cmd(cwd)
-      prompt = prompt_manager.get_prompt(username, hostname, cwd)
+      state.apply(cmd)
+      state.confirm(backend_cwd, output)
+      prompt = prompt_manager.get_prompt(username, hostname, state.display_cwd())
       reader.update_prompt(prompt)
-      reader.update_cwd(cwd)
 
       clean_output = ansi_sequences.strip_ansi_sequences(output)
+      latency_shaper.SHAPER.hold(cmd, started, backend_seconds, source)
       chan.send(clean_output.encode("utf-8"))
 
+      prefetcher.speculate(state.preamble())
+
   except EOFError:
     logger.info("Client closed connection (EOF)")
 
@@ -87,9 +104,19 @@ def handle_session(chan, username, password, addr, start_time, cowrie_connector)
       src_port=src_port,
       username=username,
       duration=duration,
-      message="Session closed"
+      message="Session closed",
+      session_id=session_id
     )
 
+    prefetcher.close()
+    cowrie_connector.release_shell()
+
+    if recorder is not None:
+      try:
+        recorder.close()
+      except Exception:
+        logger.exception("Failed to close session recording")
+
     try:
       reader.cleanup_terminal()
     except Exception:
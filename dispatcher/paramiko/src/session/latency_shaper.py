@@ -0,0 +1,183 @@
+from collections import deque
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE = "./config/latency_profiles.txt"
+SHAPING_ENABLED = os.getenv("LATENCY_SHAPING", "yes").lower() in ("1", "yes", "true")
+MAX_DELAY = float(os.getenv("LATENCY_SHAPING_MAX_DELAY", "5.0"))
+LEARN_ALPHA = float(os.getenv("LATENCY_SHAPING_LEARN_ALPHA", "0.05"))
+MIN_SAMPLES = int(os.getenv("LATENCY_SHAPING_MIN_SAMPLES", "20"))
+SAMPLE_SIZE = 1024
+DEFAULT_CLASS = "other"
+WRAPPERS = frozenset(("sudo", "busybox", "nohup", "env", "time", "nice", "timeout", "exec", "command"))
+
+SEGMENT_RE = re.compile(r"\|\||&&|[;|&\n]")
+
+class Profile:
+  def __init__(self, name: str, median: float, sigma: float):
+    self.name = name
+    self.median = median
+    self.sigma = sigma
+
+  def sample(self, rng: random.Random, median: float) -> float:
+    return median * math.exp(rng.gauss(0.0, self.sigma))
+
+def load_profiles(path: str = PROFILE_FILE):
+  profiles = {DEFAULT_CLASS: Profile(DEFAULT_CLASS, 0.004, 0.7)}
+  commands = {}
+  try:
+    with open(path, "r", encoding="utf-8") as f:
+      for line in f:
+        parts = line.split()
+        if not parts or parts[0].startswith("#"):
+          continue
+        try:
+          profiles[parts[0]] = Profile(parts[0], float(parts[1]) / 1000, float(parts[2]))
+        except (IndexError, ValueError):
+          logger.warning("Ignoring malformed latency profile: %s", line.strip())
+          continue
+        for command in parts[3:]:
+          commands[command] = parts[0]
+  except FileNotFoundError:
+    logger.warning("Latency profile file '%s' not found.", path)
+  return profiles, commands
+
+class ShaperStats:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.classes = {}
+
+  def add(self, name: str, source: str, backend: float, presented: float, delay: float, overrun: bool):
+    with self.lock:
+      entry = self.classes.get(name)
+      if entry is None:
+        entry = self.classes[name] = {
+          "count": 0,
+          "sources": {},
+          "delayed": 0,
+          "overrun": 0,
+          "delay_seconds": 0.0,
+          "backend": deque(maxlen=SAMPLE_SIZE),
+          "presented": deque(maxlen=SAMPLE_SIZE),
+        }
+      entry["count"] += 1
+      entry["sources"][source] = entry["sources"].get(source, 0) + 1
+      if delay > 0:
+        entry["delayed"] += 1
+        entry["delay_seconds"] += delay
+      if overrun:
+        entry["overrun"] += 1
+      entry["backend"].append(backend)
+      entry["presented"].append(presented)
+
+  def snapshot(self, query: dict = None) -> dict:
+    with self.lock:
+      classes = {
+        name: dict(entry, backend=sorted(entry["backend"]), presented=sorted(entry["presented"]), sources=dict(entry["sources"]))
+        for name, entry in self.classes.items()
+      }
+
+    result = {}
+    for name, entry in sorted(classes.items()):
+      result[name] = {
+        "count": entry["count"],
+        "sources": entry["sources"],
+        "delayed": entry["delayed"],
+        "overrun": entry["overrun"],
+        "delay_seconds": round(entry["delay_seconds"], 3),
+        "backend_ms": _percentiles(entry["backend"]),
+        "presented_ms": _percentiles(entry["presented"]),
+      }
+    return {"enabled": SHAPING_ENABLED, "classes": result}
+
+def _percentiles(ordered: list) -> dict:
+  if not ordered:
+    return {}
+  pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+  return {
+    "p50": round(pick(0.50) * 1000, 2),
+    "p90": round(pick(0.90) * 1000, 2),
+    "p99": round(pick(0.99) * 1000, 2),
+  }
+
+class LatencyShaper:
+  def __init__(self, profile_file: str = PROFILE_FILE, enabled: bool = SHAPING_ENABLED, seed=None):
+    self.profiles, self.commands = load_profiles(profile_file)
+    self.enabled = enabled
+    self.rng = random.Random(seed)
+    self.lock = threading.Lock()
+    self.learned = {}
+
+  def classify(self, command: str) -> Profile:
+    best = None
+    for segment in SEGMENT_RE.split(command):
+      tokens = segment.split()
+      while tokens and (os.path.basename(tokens[0]) in WRAPPERS or "=" in tokens[0]):
+        tokens = tokens[1:]
+      if not tokens:
+        continue
+      name = self.commands.get(os.path.basename(tokens[0]), DEFAULT_CLASS)
+      profile = self.profiles.get(name, self.profiles[DEFAULT_CLASS])
+      if best is None or profile.median > best.median:
+        best = profile
+    return best or self.profiles.get("builtin", self.profiles[DEFAULT_CLASS])
+
+  def _median(self, profile: Profile) -> float:
+    entry = self.learned.get(profile.name)
+    if entry is None or entry[0] < MIN_SAMPLES:
+      return profile.median
+    return max(profile.median, math.exp(entry[1]))
+
+  def observe(self, profile: Profile, backend_seconds: float):
+    if backend_seconds <= 0:
+      return
+    value = math.log(backend_seconds)
+    with self.lock:
+      entry = self.learned.get(profile.name)
+      if entry is None:
+        self.learned[profile.name] = [1, value]
+      else:
+        entry[0] += 1
+        entry[1] += LEARN_ALPHA * (value - entry[1])
+
+  def target(self, profile: Profile) -> float:
+    with self.lock:
+      return min(MAX_DELAY, profile.sample(self.rng, self._median(profile)))
+
+  def hold(self, command: str, started: float, backend_seconds: float, source: str = "backend") -> float:
+    profile = self.classify(command)
+    target = self.target(profile)
+    if source != "prefetch":
+      self.observe(profile, backend_seconds)
+    elapsed = time.time() - started
+    overrun = target <= elapsed
+    delay = target - elapsed if self.enabled and not overrun else 0.0
+
+    if delay > 0:
+      time.sleep(delay)
+
+    presented = time.time() - started
+    STATS.add(profile.name, source, backend_seconds, presented, delay, overrun)
+    return presented
+
+  def metrics(self, query: dict = None) -> dict:
+    result = STATS.snapshot(query)
+    with self.lock:
+      for name, profile in self.profiles.items():
+        entry = self.learned.get(name)
+        result.setdefault("profiles", {})[name] = {
+          "reference_median_ms": round(profile.median * 1000, 2),
+          "target_median_ms": round(self._median(profile) * 1000, 2),
+          "samples": entry[0] if entry else 0,
+        }
+    return result
+
+STATS = ShaperStats()
+SHAPER = LatencyShaper()
@@ -0,0 +1,210 @@
+from collections import Counter, OrderedDict
+from connector import backend_pool
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ALLOWLIST_FILE = "./config/prefetch_allowlist.txt"
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "yes").lower() in ("1", "yes", "true")
+MIN_PROBABILITY = float(os.getenv("PREFETCH_MIN_PROBABILITY", "0.5"))
+MIN_SUPPORT = int(os.getenv("PREFETCH_MIN_SUPPORT", "5"))
+MAX_CONTEXTS = int(os.getenv("PREFETCH_MAX_CONTEXTS", "50000"))
+WAIT_TIMEOUT = float(os.getenv("PREFETCH_WAIT_TIMEOUT", "10"))
+ORDER = 2
+
+START = "\x00start"
+UNSAFE_TOKENS = (">", "<", ";", "&", "`", "$(", "\n")
+
+def load_allowlist(path: str = ALLOWLIST_FILE) -> frozenset:
+  commands = set()
+  try:
+    with open(path, "r", encoding="utf-8") as f:
+      for line in f:
+        line = line.strip()
+        if not line or line.startswith("#"):
+          continue
+        if any(token in line for token in UNSAFE_TOKENS):
+          logger.warning("Ignoring unsafe prefetch allowlist entry: %s", line)
+          continue
+        commands.add(line)
+  except FileNotFoundError:
+    logger.warning("Prefetch allowlist '%s' not found.", path)
+  return frozenset(commands)
+
+class CommandModel:
+  def __init__(self, order: int = ORDER, max_contexts: int = MAX_CONTEXTS):
+    self.order = order
+    self.max_contexts = max_contexts
+    self.contexts = OrderedDict()
+    self.lock = threading.Lock()
+
+  def _contexts_for(self, history: list):
+    padded = [START] * self.order + list(history)
+    for size in range(self.order, 0, -1):
+      yield tuple(padded[-size:])
+
+  def observe(self, history: list, command: str):
+    with self.lock:
+      for context in self._contexts_for(history):
+        counts = self.contexts.get(context)
+        if counts is None:
+          counts = self.contexts[context] = Counter()
+          if len(self.contexts) > self.max_contexts:
+            self.contexts.popitem(last=False)
+        else:
+          self.contexts.move_to_end(context)
+        counts[command] += 1
+
+  def predict(self, history: list):
+    with self.lock:
+      for context in self._contexts_for(history):
+        counts = self.contexts.get(context)
+        if not counts:
+          continue
+        total = sum(counts.values())
+        if total < MIN_SUPPORT:
+          continue
+        command, count = counts.most_common(1)[0]
+        return command, count / total
+    return None
+
+class PrefetchStats:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.counts = Counter()
+    self.saved_seconds = 0.0
+    self.wasted_seconds = 0.0
+
+  def add(self, key: str, value: int = 1):
+    with self.lock:
+      self.counts[key] += value
+
+  def add_time(self, saved: float = 0.0, wasted: float = 0.0):
+    with self.lock:
+      self.saved_seconds += saved
+      self.wasted_seconds += wasted
+
+  def snapshot(self, query: dict = None) -> dict:
+    with self.lock:
+      counts = dict(self.counts)
+      saved = self.saved_seconds
+      wasted = self.wasted_seconds
+    launched = counts.get("launched", 0)
+    hits = counts.get("hits", 0)
+    return {
+      "enabled": PREFETCH_ENABLED,
+      "predictions": counts.get("predictions", 0),
+      "launched": launched,
+      "hits": hits,
+      "wasted": counts.get("wasted", 0),
+      "failed": counts.get("failed", 0),
+      "shed": counts.get("shed", 0),
+      "cancelled": counts.get("cancelled", 0),
+      "hit_rate": round(hits / launched, 4) if launched else 0.0,
+      "backend_seconds_saved": round(saved, 3),
+      "backend_seconds_wasted": round(wasted, 3),
+    }
+
+MODEL = CommandModel()
+STATS = PrefetchStats()
+ALLOWLIST = load_allowlist()
+
+class _Speculation:
+  def __init__(self, command: str, preamble: str):
+    self.command = command
+    self.preamble = preamble
+    self.done = threading.Event()
+    self.future = None
+    self.result = None
+    self.elapsed = 0.0
+
+class SessionPrefetcher:
+  def __init__(self, connector, username: str, password: str):
+    self.connector = connector
+    self.username = username
+    self.password = password
+    self.history = []
+    self.pending = None
+
+  def record(self, command: str):
+    MODEL.observe(self.history, command)
+    self.history.append(command)
+    del self.history[:-ORDER]
+
+  def take(self, command: str, preamble: str):
+    speculation, self.pending = self.pending, None
+    if speculation is None:
+      return None
+
+    if speculation.command != command or speculation.preamble != preamble:
+      self._discard(speculation)
+      return None
+
+    if speculation.future.cancel():
+      STATS.add("cancelled")
+      return None
+
+    started = time.time()
+    if not speculation.done.wait(WAIT_TIMEOUT) or speculation.result is None:
+      STATS.add("failed")
+      return None
+
+    STATS.add("hits")
+    STATS.add_time(saved=max(0.0, speculation.elapsed - (time.time() - started)))
+    return speculation.result
+
+  def speculate(self, preamble: str):
+    if not PREFETCH_ENABLED or self.pending is not None or self.connector.has_session_shell():
+      return
+
+    prediction = MODEL.predict(self.history)
+    if prediction is None:
+      return
+    STATS.add("predictions")
+
+    command, probability = prediction
+    if probability < MIN_PROBABILITY or command not in ALLOWLIST:
+      return
+
+    speculation = _Speculation(command, preamble)
+    try:
+      future = backend_pool.EXECUTOR.submit("cowrie", self._run, speculation, priority=backend_pool.PRIORITY_SPECULATIVE)
+    except backend_pool.BackendBusy:
+      STATS.add("shed")
+      return
+    future.add_done_callback(lambda _: speculation.done.set())
+    speculation.future = future
+    self.pending = speculation
+    STATS.add("launched")
+
+  def _run(self, speculation: _Speculation):
+    started = time.time()
+    try:
+      speculation.result = self.connector.execute_command(
+        speculation.command,
+        self.username,
+        self.password,
+        speculation.preamble,
+        purpose="speculative"
+      )
+    except Exception:
+      logger.debug("Speculative execution failed for %r", speculation.command)
+    finally:
+      speculation.elapsed = time.time() - started
+      speculation.done.set()
+
+  def _discard(self, speculation: _Speculation):
+    if speculation.future is not None and speculation.future.cancel():
+      STATS.add("cancelled")
+      return
+    STATS.add("wasted")
+    if speculation.done.is_set():
+      STATS.add_time(wasted=speculation.elapsed)
+
+  def close(self):
+    speculation, self.pending = self.pending, None
+    if speculation is not None:
+      self._discard(speculation)
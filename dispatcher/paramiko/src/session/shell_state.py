@@ -0,0 +1,96 @@
+import logging
+import posixpath
+import re
+import shlex
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR_RE = re.compile(r"\s*(?:&&|\|\||;)\s*")
+ENV_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+STATUS_VAR_RE = re.compile(r"'[^']*'|\$\?|\$\{\?\}")
+
+STATUS_PATTERNS = (
+  (re.compile(r"command not found"), 127),
+  (re.compile(r"Permission denied"), 126),
+  (re.compile(r"No such file or directory|cannot access|not a directory", re.IGNORECASE), 1),
+)
+
+def guess_exit_status(output: str) -> int:
+  for pattern, status in STATUS_PATTERNS:
+    if pattern.search(output or ""):
+      return status
+  return 0
+
+class ShellState:
+  def __init__(self, username: str):
+    self.home = "/root" if username == "root" else f"/home/{username}"
+    self.cwd = self.home
+    self.oldpwd = self.home
+    self.env = {}
+    self.last_status = 0
+
+  def display_cwd(self) -> str:
+    if self.cwd == self.home:
+      return "~"
+    if self.cwd.startswith(self.home + "/"):
+      return "~" + self.cwd[len(self.home):]
+    return self.cwd
+
+  def resolve(self, path: str) -> str:
+    if not path or path == "~":
+      return self.home
+    if path.startswith("~/"):
+      path = self.home + path[1:]
+    elif not path.startswith("/"):
+      path = posixpath.join(self.cwd, path)
+    return posixpath.normpath(path).replace("//", "/")
+
+  def expand_status(self, command: str) -> str:
+    status = str(self.last_status)
+    return STATUS_VAR_RE.sub(lambda m: m.group(0) if m.group(0).startswith("'") else status, command)
+
+  def preamble(self) -> str:
+    parts = []
+    if self.cwd != self.home:
+      parts.append(f"cd {shlex.quote(self.cwd)}")
+    for name, value in self.env.items():
+      parts.append(f"export {name}={shlex.quote(value)}")
+    return "; ".join(parts)
+
+  def apply(self, command: str):
+    for segment in SEPARATOR_RE.split(command):
+      try:
+        tokens = shlex.split(segment)
+      except ValueError:
+        continue
+      if not tokens:
+        continue
+
+      name, args = tokens[0], tokens[1:]
+      if name == "cd":
+        self._cd(args[0] if args else "~")
+      elif name == "export":
+        for arg in args:
+          key, sep, value = arg.partition("=")
+          if sep and ENV_NAME_RE.match(key):
+            self.env[key] = value
+      elif name == "unset":
+        for arg in args:
+          self.env.pop(arg, None)
+
+  def _cd(self, target: str):
+    if target == "-":
+      target = self.oldpwd
+    resolved = self.resolve(target)
+    if resolved != self.cwd:
+      self.oldpwd = self.cwd
+      self.cwd = resolved
+
+  def confirm(self, prompt_cwd: str, output: str = ""):
+    self.last_status = guess_exit_status(output)
+    if not prompt_cwd:
+      return
+    observed = self.resolve(prompt_cwd)
+    if observed != self.cwd:
+      logger.debug("Backend cwd %s differs from local model %s, adopting backend", observed, self.cwd)
+      self.cwd = observed
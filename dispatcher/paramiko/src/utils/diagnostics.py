@@ -0,0 +1,255 @@
+from collections import Counter
+import functools
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+DIAG_DIR = os.getenv("PARAMIKO_DIAG_DIR", "/var/log/paramiko/diag")
+PROFILE_INTERVAL = float(os.getenv("PARAMIKO_PROFILE_INTERVAL", "0.005"))
+PROFILE_MAX_SECONDS = float(os.getenv("PARAMIKO_PROFILE_MAX_SECONDS", "300"))
+THREAD_DUMP_INTERVAL = float(os.getenv("PARAMIKO_THREAD_DUMP_INTERVAL", "0"))
+SLOW_SPAN_SECONDS = float(os.getenv("PARAMIKO_SLOW_SPAN_MS", "5000")) / 1000
+MAX_STACK_DEPTH = 64
+
+class SpanStats:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.spans = {}
+
+  def add(self, name: str, elapsed: float, failed: bool):
+    with self.lock:
+      span = self.spans.get(name)
+      if span is None:
+        span = self.spans[name] = {"count": 0, "errors": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+      span["count"] += 1
+      span["errors"] += failed
+      span["total"] += elapsed
+      span["last"] = elapsed
+      if elapsed > span["max"]:
+        span["max"] = elapsed
+
+  def snapshot(self, query: dict = None) -> dict:
+    with self.lock:
+      spans = {name: dict(span) for name, span in self.spans.items()}
+      if query and query.get("reset") in ("1", "yes", "true"):
+        self.spans.clear()
+
+    result = {}
+    for name, span in sorted(spans.items()):
+      result[name] = {
+        "count": span["count"],
+        "errors": span["errors"],
+        "mean_ms": round(span["total"] / span["count"] * 1000, 3) if span["count"] else 0.0,
+        "max_ms": round(span["max"] * 1000, 3),
+        "last_ms": round(span["last"] * 1000, 3),
+      }
+    return result
+
+SPANS = SpanStats()
+
+class span:
+  def __init__(self, name: str):
+    self.name = name
+    self.started = 0.0
+
+  def __enter__(self):
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    elapsed = time.perf_counter() - self.started
+    SPANS.add(self.name, elapsed, exc_type is not None)
+    if elapsed >= SLOW_SPAN_SECONDS:
+      logger.warning("Slow span %s took %.3fs in %s", self.name, elapsed, threading.current_thread().name)
+    return False
+
+def timed(name: str):
+  def decorator(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      with span(name):
+        return func(*args, **kwargs)
+    return wrapper
+  return decorator
+
+def _frame_stack(frame) -> list:
+  stack = []
+  while frame is not None and len(stack) < MAX_STACK_DEPTH:
+    code = frame.f_code
+    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+    frame = frame.f_back
+  stack.reverse()
+  return stack
+
+def _thread_role(name: str) -> str:
+  return name.split("-", 1)[0] if name else "unknown"
+
+class SamplingProfiler:
+  def __init__(self, interval: float = PROFILE_INTERVAL, directory: str = DIAG_DIR):
+    self.interval = interval
+    self.directory = directory
+    self.lock = threading.Lock()
+    self.stacks = Counter()
+    self.samples = 0
+    self.started_at = 0.0
+    self.deadline = 0.0
+    self.thread = None
+    self.stop_event = threading.Event()
+    self.last_output = None
+
+  @property
+  def running(self) -> bool:
+    return self.thread is not None and self.thread.is_alive()
+
+  def start(self, seconds: float = PROFILE_MAX_SECONDS) -> bool:
+    with self.lock:
+      if self.running:
+        return False
+      self.stacks = Counter()
+      self.samples = 0
+      self.started_at = time.time()
+      self.deadline = self.started_at + min(seconds, PROFILE_MAX_SECONDS)
+      self.stop_event.clear()
+      self.thread = threading.Thread(target=self._run, name="diag-profiler", daemon=True)
+      self.thread.start()
+    logger.warning("Sampling profiler started (interval %.1fms)", self.interval * 1000)
+    return True
+
+  def stop(self):
+    with self.lock:
+      thread = self.thread
+      if thread is None:
+        return self.last_output
+      self.stop_event.set()
+    if thread is not threading.current_thread():
+      thread.join()
+    return self.last_output
+
+  def toggle(self):
+    if self.running:
+      self.stop()
+    else:
+      self.start()
+
+  def _run(self):
+    own = threading.get_ident()
+    try:
+      while not self.stop_event.is_set() and time.time() < self.deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+          if ident == own:
+            continue
+          name = names.get(ident, str(ident))
+          self.stacks[";".join([_thread_role(name)] + _frame_stack(frame))] += 1
+        self.samples += 1
+        self.stop_event.wait(self.interval)
+    except Exception:
+      logger.exception("Sampling profiler failed")
+    finally:
+      self.last_output = self._write()
+      with self.lock:
+        self.thread = None
+
+  def _write(self):
+    try:
+      os.makedirs(self.directory, exist_ok=True)
+      stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(self.started_at))
+      path = os.path.join(self.directory, f"profile-{stamp}.collapsed")
+      with open(path, "w", encoding="utf-8") as f:
+        for stack, count in self.stacks.most_common():
+          f.write(f"{stack} {count}\n")
+      logger.warning("Sampling profiler wrote %d samples to %s", self.samples, path)
+      return path
+    except Exception:
+      logger.exception("Failed to write profile")
+      return None
+
+  def status(self) -> dict:
+    return {
+      "running": self.running,
+      "interval_ms": self.interval * 1000,
+      "samples": self.samples,
+      "distinct_stacks": len(self.stacks),
+      "started_at": self.started_at or None,
+      "last_output": self.last_output,
+    }
+
+PROFILER = SamplingProfiler()
+
+def dump_threads() -> list:
+  frames = sys._current_frames()
+  threads = []
+  for thread in threading.enumerate():
+    frame = frames.get(thread.ident)
+    threads.append({
+      "name": thread.name,
+      "ident": thread.ident,
+      "daemon": thread.daemon,
+      "stack": traceback.format_stack(frame) if frame is not None else [],
+    })
+  return sorted(threads, key=lambda thread: thread["name"])
+
+def _summarize_threads(threads: list) -> dict:
+  return dict(Counter(_thread_role(thread["name"]) for thread in threads))
+
+def write_thread_dump(path: str = None) -> str:
+  threads = dump_threads()
+  path = path or os.path.join(DIAG_DIR, "threads.log")
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, "a", encoding="utf-8") as f:
+    f.write(f"===== {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())} {len(threads)} threads {_summarize_threads(threads)}\n")
+    for thread in threads:
+      f.write(f"--- {thread['name']} (ident={thread['ident']}, daemon={thread['daemon']})\n")
+      f.write("".join(thread["stack"]))
+  return path
+
+def _thread_dump_loop(interval: float):
+  while True:
+    time.sleep(interval)
+    try:
+      write_thread_dump()
+    except Exception:
+      logger.exception("Failed to write thread dump")
+
+def handle_threads(query: dict) -> dict:
+  threads = dump_threads()
+  if query.get("stacks") in ("0", "no", "false"):
+    for thread in threads:
+      thread.pop("stack")
+  else:
+    for thread in threads:
+      thread["stack"] = "".join(thread["stack"]).splitlines()
+  return {"count": len(threads), "roles": _summarize_threads(threads), "threads": threads}
+
+def handle_profile(query: dict) -> dict:
+  action = query.get("action", "status")
+  if action == "start":
+    try:
+      seconds = float(query.get("seconds", PROFILE_MAX_SECONDS))
+    except ValueError:
+      raise ValueError("seconds must be a number")
+    if not PROFILER.start(seconds):
+      raise ValueError("profiler already running")
+  elif action == "stop":
+    PROFILER.stop()
+  elif action != "status":
+    raise ValueError("action must be one of start, stop, status")
+  return PROFILER.status()
+
+def _on_sigusr1(signum, frame):
+  threading.Thread(target=PROFILER.toggle, name="diag-toggle", daemon=True).start()
+
+def start():
+  try:
+    signal.signal(signal.SIGUSR1, _on_sigusr1)
+  except (AttributeError, ValueError):
+    logger.warning("SIGUSR1 profiler toggle unavailable")
+
+  if THREAD_DUMP_INTERVAL > 0:
+    threading.Thread(target=_thread_dump_loop, args=(THREAD_DUMP_INTERVAL,), name="diag-threaddump", daemon=True).start()
@@ -0,0 +1,345 @@
+from urllib.parse import urlsplit
+import base64
+import datetime
+import http.client
+import json
+import logging
+import os
+import queue
+import ssl
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ES_BULK_URL = os.getenv("ES_BULK_URL", "")
+ES_BULK_INDEX = os.getenv("ES_BULK_INDEX", "logstash-%Y.%m.%d")
+ES_USER = os.getenv("ES_USER", "")
+ES_PASSWORD = os.getenv("ES_PASSWORD", "")
+ES_CA_CERT = os.getenv("ES_CA_CERT", "")
+ES_BULK_BATCH_SIZE = int(os.getenv("ES_BULK_BATCH_SIZE", "500"))
+ES_BULK_FLUSH_INTERVAL = float(os.getenv("ES_BULK_FLUSH_INTERVAL", "1.0"))
+ES_BULK_QUEUE_SIZE = int(os.getenv("ES_BULK_QUEUE_SIZE", "100000"))
+ES_SPOOL_DIR = os.getenv("ES_SPOOL_DIR", "/var/log/paramiko/spool")
+ES_SPOOL_MAX_BYTES = int(os.getenv("ES_SPOOL_MAX_BYTES", str(512 * 1024 * 1024)))
+ES_DEAD_LETTER = os.getenv("ES_DEAD_LETTER", "/var/log/paramiko/dead_letter.ndjson")
+
+RETRY_BASE = 1.0
+RETRY_MAX = 60.0
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+AUTH_STATUS = (401, 403)
+
+class BulkError(Exception):
+  pass
+
+class BulkRejected(Exception):
+  pass
+
+class BulkShipper:
+  def __init__(self, url: str, index: str = ES_BULK_INDEX, username: str = "", password: str = "",
+               ca_cert: str = "", batch_size: int = ES_BULK_BATCH_SIZE,
+               flush_interval: float = ES_BULK_FLUSH_INTERVAL, queue_size: int = ES_BULK_QUEUE_SIZE,
+               spool_dir: str = ES_SPOOL_DIR, spool_max_bytes: int = ES_SPOOL_MAX_BYTES,
+               dead_letter: str = ES_DEAD_LETTER, timeout: float = 10.0):
+    parts = urlsplit(url)
+    self.scheme = parts.scheme or "http"
+    self.host = parts.hostname
+    self.port = parts.port or (443 if self.scheme == "https" else 80)
+    self.path = parts.path.rstrip("/") + "/_bulk"
+    self.index = index
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval
+    self.spool_dir = spool_dir
+    self.spool_max_bytes = spool_max_bytes
+    self.dead_letter = dead_letter
+    self.timeout = timeout
+    self.ca_cert = ca_cert
+
+    self.headers = {
+      "Content-Type": "application/x-ndjson",
+      "Connection": "keep-alive",
+    }
+    if username:
+      token = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+      self.headers["Authorization"] = f"Basic {token}"
+
+    self.queue = queue.Queue(maxsize=queue_size)
+    self.actions = {}
+    self.conn = None
+    self.retry_delay = 0.0
+    self.next_attempt = 0.0
+    self.spool_seq = 0
+    self.stats_lock = threading.Lock()
+    self.stats = {
+      "queued": 0,
+      "sent": 0,
+      "failed": 0,
+      "dropped": 0,
+      "spooled": 0,
+      "replayed": 0,
+      "dead_lettered": 0,
+      "batches": 0,
+      "bytes": 0,
+      "last_batch_seconds": 0.0,
+    }
+    self.started_at = time.time()
+    self.thread = None
+
+  def start(self):
+    os.makedirs(self.spool_dir, exist_ok=True)
+    self.thread = threading.Thread(target=self._run, name="es-shipper", daemon=True)
+    self.thread.start()
+
+  def submit(self, line: str, timestamp: str):
+    try:
+      self.queue.put_nowait((line, timestamp))
+      self._count("queued")
+    except queue.Full:
+      self._count("dropped")
+
+  def metrics(self, query: dict = None) -> dict:
+    with self.stats_lock:
+      stats = dict(self.stats)
+    elapsed = max(time.time() - self.started_at, 1e-6)
+    stats["events_per_second"] = round(stats["sent"] / elapsed, 2)
+    stats["queue_depth"] = self.queue.qsize()
+    stats["spool_files"] = len(self._spool_files())
+    stats["retry_delay"] = self.retry_delay
+    return stats
+
+  def _count(self, key: str, value=1):
+    with self.stats_lock:
+      self.stats[key] += value
+
+  def _run(self):
+    while True:
+      batch = self._collect()
+      try:
+        if batch:
+          body = self._encode(batch)
+          if time.time() < self.next_attempt:
+            self._spool(body, len(batch))
+          else:
+            self._ship(body, len(batch))
+        self._replay_spool()
+      except Exception:
+        logger.exception("Unexpected error in bulk shipper loop")
+
+  def _collect(self) -> list:
+    batch = []
+    deadline = time.time() + self.flush_interval
+
+    while len(batch) < self.batch_size:
+      remaining = deadline - time.time()
+      if remaining <= 0:
+        break
+      try:
+        batch.append(self.queue.get(timeout=remaining))
+      except queue.Empty:
+        break
+
+    return batch
+
+  def _encode(self, batch: list) -> bytes:
+    lines = []
+    for line, timestamp in batch:
+      lines.append(self._action_for(timestamp))
+      lines.append('{"@timestamp": ' + json.dumps(timestamp) + ", " + line[1:])
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+  def _action_for(self, timestamp) -> str:
+    day = (timestamp or "")[:10]
+    action = self.actions.get(day)
+    if action is None:
+      try:
+        moment = datetime.datetime.fromisoformat(timestamp)
+      except (TypeError, ValueError):
+        moment = datetime.datetime.now(datetime.timezone.utc)
+      action = json.dumps({"index": {"_index": moment.strftime(self.index)}})
+      if len(self.actions) > 32:
+        self.actions.clear()
+      self.actions[day] = action
+    return action
+
+  def _connect(self):
+    if self.conn is not None:
+      return self.conn
+
+    if self.scheme == "https":
+      context = ssl.create_default_context(cafile=self.ca_cert or None)
+      self.conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=context)
+    else:
+      self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+    return self.conn
+
+  def _close(self):
+    if self.conn is not None:
+      try:
+        self.conn.close()
+      except Exception:
+        pass
+    self.conn = None
+
+  def _post(self, body: bytes) -> list:
+    conn = self._connect()
+    try:
+      conn.request("POST", self.path, body=body, headers=self.headers)
+      response = conn.getresponse()
+      payload = response.read()
+    except Exception as e:
+      self._close()
+      raise BulkError(f"Bulk request failed: {e}") from e
+
+    if response.getheader("Connection", "").lower() == "close":
+      self._close()
+
+    if response.status in RETRYABLE_STATUS:
+      raise BulkError(f"Bulk request returned {response.status}")
+    if response.status in AUTH_STATUS:
+      logger.error("Bulk request rejected with %s, check ES_USER/ES_PASSWORD", response.status)
+      raise BulkError(f"Bulk request returned {response.status}")
+    if response.status >= 300:
+      raise BulkRejected(f"bulk request rejected with {response.status}: {payload[:512].decode('utf-8', errors='replace')}")
+
+    result = json.loads(payload or b"{}")
+    if not result.get("errors"):
+      return [], []
+
+    retry = []
+    rejected = []
+    for position, item in enumerate(result.get("items", [])):
+      status = next(iter(item.values()), {}).get("status", 0)
+      if status in RETRYABLE_STATUS:
+        retry.append(position)
+      elif status >= 300:
+        rejected.append((position, f"item rejected with {status}: {json.dumps(item)[:512]}"))
+    return retry, rejected
+
+  def _ship(self, body: bytes, count: int) -> bool:
+    started = time.perf_counter()
+    lines = body.split(b"\n")
+    try:
+      retry, rejected = self._post(body)
+    except BulkError:
+      logger.warning("Elasticsearch unavailable, spooling %d events", count)
+      self._backoff()
+      self._spool(body, count)
+      return False
+    except BulkRejected as e:
+      self._count("failed", count)
+      self._dead_letter([(lines[2 * i + 1], str(e)) for i in range(count)])
+      return True
+
+    self.retry_delay = 0.0
+    self.next_attempt = 0.0
+    self._count("batches")
+    self._count("bytes", len(body))
+    self._count("sent", count - len(retry) - len(rejected))
+    with self.stats_lock:
+      self.stats["last_batch_seconds"] = round(time.perf_counter() - started, 6)
+
+    if rejected:
+      self._count("failed", len(rejected))
+      self._dead_letter([(lines[2 * i + 1], reason) for i, reason in rejected])
+    if retry:
+      retry_body = b"".join(lines[2 * i] + b"\n" + lines[2 * i + 1] + b"\n" for i in retry)
+      self._backoff()
+      self._spool(retry_body, len(retry))
+    return True
+
+  def _dead_letter(self, events: list):
+    logger.error("Dead-lettering %d events: %s", len(events), events[0][1])
+    try:
+      directory = os.path.dirname(self.dead_letter)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      with open(self.dead_letter, "ab") as f:
+        for source, reason in events:
+          f.write(b'{"reason": ' + json.dumps(reason).encode("utf-8") + b', "event": ' + source + b"}\n")
+      self._count("dead_lettered", len(events))
+    except OSError:
+      logger.exception("Failed to write dead-letter file %s", self.dead_letter)
+
+  def _backoff(self):
+    self.retry_delay = min(RETRY_MAX, max(RETRY_BASE, self.retry_delay * 2))
+    self.next_attempt = time.time() + self.retry_delay
+
+  def _spool_files(self) -> list:
+    try:
+      names = [name for name in os.listdir(self.spool_dir) if name.endswith(".ndjson")]
+    except FileNotFoundError:
+      return []
+    return sorted(os.path.join(self.spool_dir, name) for name in names)
+
+  def _spool(self, body: bytes, count: int):
+    self.spool_seq += 1
+    path = os.path.join(self.spool_dir, f"{time.time_ns():020d}-{self.spool_seq:06d}.ndjson")
+    try:
+      with open(path, "wb") as f:
+        f.write(body)
+      self._count("spooled", count)
+    except Exception:
+      logger.exception("Failed to spool bulk batch")
+      self._count("dropped", count)
+      return
+
+    self._trim_spool()
+
+  def _trim_spool(self):
+    files = self._spool_files()
+    sizes = [(path, os.path.getsize(path)) for path in files]
+    total = sum(size for _, size in sizes)
+
+    for path, size in sizes:
+      if total <= self.spool_max_bytes:
+        break
+      try:
+        with open(path, "rb") as f:
+          dropped = f.read().count(b"\n") // 2
+        os.remove(path)
+        self._count("dropped", dropped)
+        logger.warning("Spool limit exceeded, dropped %s", path)
+      except Exception:
+        logger.exception("Failed to trim spool file %s", path)
+      total -= size
+
+  def _replay_spool(self):
+    if time.time() < self.next_attempt:
+      return
+
+    for path in self._spool_files():
+      try:
+        with open(path, "rb") as f:
+          body = f.read()
+        os.remove(path)
+      except Exception:
+        logger.exception("Failed to read spool file %s", path)
+        continue
+
+      count = body.count(b"\n") // 2
+      self._count("spooled", -count)
+      if not self._ship(body, count):
+        return
+      self._count("replayed", count)
+
+SHIPPER = None
+
+def start_from_env():
+  global SHIPPER
+
+  if not ES_BULK_URL or SHIPPER is not None:
+    return SHIPPER
+
+  SHIPPER = BulkShipper(ES_BULK_URL, username=ES_USER, password=ES_PASSWORD, ca_cert=ES_CA_CERT)
+  SHIPPER.start()
+  logger.info("Shipping events directly to %s", ES_BULK_URL)
+  return SHIPPER
+
+def submit(line: str, timestamp: str):
+  if SHIPPER is not None:
+    SHIPPER.submit(line, timestamp)
+
+def metrics(query: dict) -> dict:
+  if SHIPPER is None:
+    return {"enabled": False}
+  return dict(SHIPPER.metrics(), enabled=True)
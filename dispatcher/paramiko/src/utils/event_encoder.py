@@ -0,0 +1,94 @@
+from json.encoder import encode_basestring_ascii
+import datetime
+import json
+import os
+import threading
+import time
+
+EVENT_BACKEND = os.getenv("PARAMIKO_EVENT_BACKEND", "auto")
+
+_orjson = None
+if EVENT_BACKEND in ("auto", "orjson"):
+  try:
+    import orjson as _orjson
+  except ImportError:
+    _orjson = None
+
+BACKEND = "orjson" if _orjson is not None else "json"
+
+def _dumps(value) -> str:
+  if _orjson is not None:
+    try:
+      return _orjson.dumps(value).decode("utf-8")
+    except TypeError:
+      pass
+  return json.dumps(value)
+
+def encode_value(value) -> str:
+  kind = type(value)
+  if kind is str:
+    return encode_basestring_ascii(value)
+  if kind is int:
+    return int.__repr__(value)
+  if value is None:
+    return "null"
+  if value is True:
+    return "true"
+  if value is False:
+    return "false"
+  return _dumps(value)
+
+class CoarseClock:
+  def __init__(self):
+    self._cache = (-1, "")
+
+  def isoformat(self, now: float = None) -> str:
+    now = time.time() if now is None else now
+    second = int(now)
+    usec = int((now - second) * 1000000)
+
+    cached_second, prefix = self._cache
+    if cached_second != second:
+      moment = datetime.datetime.fromtimestamp(second, datetime.timezone.utc)
+      prefix = moment.strftime("%Y-%m-%dT%H:%M:%S")
+      self._cache = (second, prefix)
+
+    if usec:
+      return f"{prefix}.{usec:06d}+00:00"
+    return f"{prefix}+00:00"
+
+class EventTemplate:
+  def __init__(self, constants: dict, fields: tuple):
+    self.fields = fields
+    self.head = '{"timestamp": '
+    self.constants = "".join(f", {encode_basestring_ascii(key)}: {encode_value(value)}" for key, value in constants.items())
+    self.keys = tuple(f", {encode_basestring_ascii(field)}: " for field in fields)
+
+  def encode(self, timestamp: str, values: tuple) -> str:
+    parts = [self.head, encode_basestring_ascii(timestamp), self.constants]
+    for key, value in zip(self.keys, values):
+      parts.append(key)
+      parts.append(encode_value(value))
+    parts.append("}")
+    return "".join(parts)
+
+class LineWriter:
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.files = {}
+
+  def write(self, path: str, line: str):
+    with self.lock:
+      f = self.files.get(path)
+      if f is None:
+        f = self.files[path] = open(path, "a", encoding="utf-8")
+      try:
+        f.write(line)
+        f.flush()
+      except OSError:
+        self.files.pop(path, None)
+        f.close()
+        raise
+
+CLOCK = CoarseClock()
+WRITER = LineWriter()
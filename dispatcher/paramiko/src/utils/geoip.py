@@ -0,0 +1,220 @@
+from functools import lru_cache
+import bisect
+import csv
+import ipaddress
+import logging
+import mmap
+import os
+import socket
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+GEOIP_DB = os.getenv("GEOIP_DB", "./config/geoip.db")
+GEOIP_ENABLED = os.getenv("GEOIP_ENABLED", "yes").lower() in ("1", "yes", "true")
+CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "65536"))
+
+MAGIC = b"YZGEOIP1"
+HEADER = struct.Struct("<8sII")
+FIELDS = ("src_country", "src_asn", "src_as_org")
+EMPTY = (None, None, None)
+
+class GeoDatabase:
+  def __init__(self, path: str):
+    if sys.byteorder != "little":
+      raise ValueError("GeoIP database requires a little-endian host")
+
+    with open(path, "rb") as f:
+      self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    self.path = path
+
+    magic, count, strings = HEADER.unpack_from(self.map, 0)
+    if magic != MAGIC:
+      self.map.close()
+      raise ValueError(f"{path} is not a GeoIP range database")
+
+    view = memoryview(self.map)
+    offset = HEADER.size
+
+    def take(size: int, fmt: str):
+      nonlocal offset
+      section = view[offset:offset + size * count].cast(fmt)
+      offset += (size * count + 3) & ~3
+      return section
+
+    self.starts = take(4, "I")
+    self.ends = take(4, "I")
+    self.asns = take(4, "I")
+    self.orgs = take(4, "I")
+    self.countries = take(2, "H")
+    string_offsets = view[offset:offset + 4 * (strings + 1)].cast("I")
+    blob = offset + 4 * (strings + 1)
+    self.strings = (None,) + tuple(
+      self.map[blob + string_offsets[i]:blob + string_offsets[i + 1]].decode("utf-8") for i in range(1, strings)
+    )
+    self.ranges = count
+
+  def find(self, address: int) -> tuple:
+    index = bisect.bisect_right(self.starts, address) - 1
+    if index < 0 or address > self.ends[index]:
+      return EMPTY
+    return self.strings[self.countries[index]], self.asns[index] or None, self.strings[self.orgs[index]]
+
+def _open(path: str):
+  if not GEOIP_ENABLED:
+    return None
+  try:
+    database = GeoDatabase(path)
+  except FileNotFoundError:
+    logger.info("GeoIP database '%s' not found, enrichment disabled", path)
+    return None
+  except Exception:
+    logger.exception("Failed to open GeoIP database '%s'", path)
+    return None
+  logger.info("Loaded GeoIP database '%s' with %d ranges", path, database.ranges)
+  return database
+
+DB = _open(GEOIP_DB)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _lookup(ip: str) -> tuple:
+  if ip.startswith("::ffff:"):
+    ip = ip[7:]
+  try:
+    packed = socket.inet_pton(socket.AF_INET, ip)
+  except OSError:
+    return EMPTY
+  return DB.find(int.from_bytes(packed, "big"))
+
+def lookup(ip) -> tuple:
+  if DB is None or type(ip) is not str:
+    return EMPTY
+  return _lookup(ip)
+
+def metrics(query: dict = None) -> dict:
+  info = _lookup.cache_info()
+  total = info.hits + info.misses
+  return {
+    "enabled": DB is not None,
+    "database": DB.path if DB is not None else None,
+    "ranges": DB.ranges if DB is not None else 0,
+    "cache_size": info.currsize,
+    "cache_max": info.maxsize,
+    "cache_hits": info.hits,
+    "cache_misses": info.misses,
+    "cache_hit_rate": round(info.hits / total, 4) if total else 0.0,
+  }
+
+def _network_range(network: str) -> tuple:
+  net = ipaddress.ip_network(network, strict=False)
+  return int(net.network_address), int(net.broadcast_address)
+
+def read_country_blocks(blocks_path: str, locations_path: str) -> list:
+  codes = {}
+  with open(locations_path, "r", encoding="utf-8", newline="") as f:
+    for row in csv.DictReader(f):
+      codes[row["geoname_id"]] = row.get("country_iso_code") or row.get("continent_code") or ""
+
+  ranges = []
+  with open(blocks_path, "r", encoding="utf-8", newline="") as f:
+    for row in csv.DictReader(f):
+      geoname = row.get("geoname_id") or row.get("registered_country_geoname_id") or ""
+      code = codes.get(geoname, "")
+      if code:
+        ranges.append((*_network_range(row["network"]), code))
+  ranges.sort()
+  return ranges
+
+def read_asn_blocks(blocks_path: str) -> list:
+  ranges = []
+  with open(blocks_path, "r", encoding="utf-8", newline="") as f:
+    for row in csv.DictReader(f):
+      asn = int(row["autonomous_system_number"] or 0)
+      if asn:
+        ranges.append((*_network_range(row["network"]), (asn, row.get("autonomous_system_organization") or "")))
+  ranges.sort()
+  return ranges
+
+def merge_ranges(countries: list, asns: list) -> list:
+  bounds = sorted({start for start, _, _ in countries} | {end + 1 for _, end, _ in countries}
+                  | {start for start, _, _ in asns} | {end + 1 for _, end, _ in asns})
+
+  merged = []
+  ci = ai = 0
+  for start, limit in zip(bounds, bounds[1:]):
+    end = limit - 1
+    while ci < len(countries) and countries[ci][1] < start:
+      ci += 1
+    while ai < len(asns) and asns[ai][1] < start:
+      ai += 1
+    country = countries[ci][2] if ci < len(countries) and countries[ci][0] <= start else ""
+    asn, org = asns[ai][2] if ai < len(asns) and asns[ai][0] <= start else (0, "")
+    if not country and not asn:
+      continue
+
+    if merged and merged[-1][1] == start - 1 and merged[-1][2:] == (country, asn, org):
+      merged[-1] = (merged[-1][0], end, country, asn, org)
+    else:
+      merged.append((start, end, country, asn, org))
+  return merged
+
+def write_database(ranges: list, output: str):
+  strings = {"": 0}
+  blob = [b""]
+  offsets = [0, 0]
+
+  def intern(value: str) -> int:
+    index = strings.get(value)
+    if index is None:
+      encoded = value.encode("utf-8")
+      index = strings[value] = len(blob)
+      blob.append(encoded)
+      offsets.append(offsets[-1] + len(encoded))
+    return index
+
+  columns = ([], [], [], [], [])
+  for start, end, country, asn, org in ranges:
+    columns[0].append(start)
+    columns[1].append(end)
+    columns[2].append(asn)
+    columns[3].append(intern(org))
+    columns[4].append(intern(country))
+
+  def pack(fmt: str, values: list) -> bytes:
+    data = struct.pack(f"<{len(values)}{fmt}", *values)
+    return data + b"\0" * (-len(data) % 4)
+
+  temporary = output + ".tmp"
+  with open(temporary, "wb") as f:
+    f.write(HEADER.pack(MAGIC, len(ranges), len(blob)))
+    for column in columns[:4]:
+      f.write(pack("I", column))
+    f.write(pack("H", columns[4]))
+    f.write(pack("I", offsets))
+    f.write(b"".join(blob))
+  os.replace(temporary, output)
+
+def build(country_blocks: str, country_locations: str, asn_blocks: str, output: str) -> int:
+  ranges = merge_ranges(read_country_blocks(country_blocks, country_locations), read_asn_blocks(asn_blocks))
+  write_database(ranges, output)
+  return len(ranges)
+
+def main(argv):
+  if len(argv) == 6 and argv[1] == "build":
+    count = build(argv[2], argv[3], argv[4], argv[5])
+    print(f"wrote {count} ranges to {argv[5]}")
+    return 0
+
+  if len(argv) >= 4 and argv[1] == "lookup":
+    database = GeoDatabase(argv[2])
+    for ip in argv[3:]:
+      print(ip, *database.find(int(ipaddress.IPv4Address(ip))))
+    return 0
+
+  print("usage: geoip.py build <Country-Blocks-IPv4.csv> <Country-Locations-en.csv> <ASN-Blocks-IPv4.csv> <output.db>")
+  print("       geoip.py lookup <geoip.db> <ip>...")
+  return 2
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv))
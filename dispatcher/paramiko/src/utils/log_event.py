@@ -1,50 +1,66 @@
-import json
-import datetime
-
-def log_auth_event(addr, dest_ip, dest_port, username, password, success):
-  log = {
-    "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-    "type": "Paramiko",
-    "eventid": "paramiko.login.attempt",
-    "src_ip": addr[0],
-    "src_port": addr[1],
-    "dest_ip": dest_ip,
-    "dest_port": dest_port,
-    "username": username,
-    "password": password,
-    "protocol": "ssh",
-    "success": success
-  }
-
-  with open("/var/log/paramiko/paramiko.log", "a") as f:
-    f.write(json.dumps(log) + "\n")
-
-def log_command_event(src_ip, src_port, username, command, cwd):
-  log = {
-    "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-    "type": "Paramiko",
-    "eventid": "paramiko.command.input",
-    "src_ip": src_ip,
-    "src_port": src_port,
-    "username": username,
-    "command": command,
-    "cwd": cwd,
-    "protocol": "ssh"
-  }
-  with open("/var/log/paramiko/paramiko.log", "a") as f:
-    f.write(json.dumps(log) + "\n")
-
-def log_session_close(src_ip, src_port, username, duration, message):
-  log = {
-    "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-    "type": "Paramiko",
-    "eventid": "paramiko.session.close",
-    "src_ip": src_ip,
-    "src_port": src_port,
-    "username": username,
-    "duration": f"{round(duration, 2)}s",
-    "message": message,
-    "protocol": "ssh"
-  }
-  with open("/var/log/paramiko/paramiko.log", "a") as f:
-    f.write(json.dumps(log) + "\n")
+from utils import es_shipper, event_encoder, geoip
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+LOG_FILE = "/var/log/paramiko/paramiko.log"
+SESSION_MAP_FILE = "/var/log/paramiko/session_map.log"
+FILE_SINK_ENABLED = os.getenv("PARAMIKO_FILE_SINK", "yes").lower() in ("1", "yes", "true")
+
+PARAMIKO = {"type": "Paramiko", "protocol": "ssh"}
+
+COMMAND_TEMPLATE = event_encoder.EventTemplate(
+  dict(PARAMIKO, eventid="paramiko.command.input"),
+  ("src_ip", "src_port", "username", "command", "cwd", "dispatcher_session", "classification") + geoip.FIELDS
+)
+CLOSE_TEMPLATE = event_encoder.EventTemplate(
+  dict(PARAMIKO, eventid="paramiko.session.close"),
+  ("src_ip", "src_port", "username", "duration", "message", "dispatcher_session") + geoip.FIELDS
+)
+BACKEND_TEMPLATE = event_encoder.EventTemplate(
+  {"type": "SessionMap", "eventid": "paramiko.session.backend"},
+  ("dispatcher_session", "backend", "backend_port", "backend_src_ip", "backend_src_port", "purpose")
+)
+SNAPSHOT_TEMPLATE = event_encoder.EventTemplate(
+  dict(PARAMIKO, eventid="paramiko.analytics.snapshot"),
+  ("window", "totals", "top")
+)
+
+_auth_templates = {}
+
+def _auth_template(dest_ip, dest_port):
+  template = _auth_templates.get((dest_ip, dest_port))
+  if template is None:
+    template = _auth_templates[(dest_ip, dest_port)] = event_encoder.EventTemplate(
+      dict(PARAMIKO, eventid="paramiko.login.attempt", dest_ip=dest_ip, dest_port=dest_port),
+      ("src_ip", "src_port", "username", "password", "success", "dispatcher_session") + geoip.FIELDS
+    )
+  return template
+
+def _emit(template, values, path=LOG_FILE):
+  timestamp = event_encoder.CLOCK.isoformat()
+  line = template.encode(timestamp, values)
+
+  if FILE_SINK_ENABLED:
+    try:
+      event_encoder.WRITER.write(path, line + "\n")
+    except OSError:
+      logger.exception("Failed to write event to %s", path)
+
+  es_shipper.submit(line, timestamp)
+
+def log_auth_event(addr, dest_ip, dest_port, username, password, success, session_id=None):
+  _emit(_auth_template(dest_ip, dest_port), (addr[0], addr[1], username, password, success, session_id) + geoip.lookup(addr[0]))
+
+def log_command_event(src_ip, src_port, username, command, cwd, session_id=None, classification=None):
+  _emit(COMMAND_TEMPLATE, (src_ip, src_port, username, command, cwd, session_id, classification or []) + geoip.lookup(src_ip))
+
+def log_session_close(src_ip, src_port, username, duration, message, session_id=None):
+  _emit(CLOSE_TEMPLATE, (src_ip, src_port, username, f"{round(duration, 2)}s", message, session_id) + geoip.lookup(src_ip))
+
+def log_backend_session(session_id, backend, backend_port, local_ip, local_port, purpose):
+  _emit(BACKEND_TEMPLATE, (session_id, backend, backend_port, local_ip, local_port, purpose), SESSION_MAP_FILE)
+
+def log_analytics_snapshot(snapshot):
+  _emit(SNAPSHOT_TEMPLATE, (snapshot["window"], snapshot["totals"], snapshot["top"]))
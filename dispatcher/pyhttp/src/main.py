@@ -0,0 +1,91 @@
+from proxy import handler, protocol
+from router import rules
+from utils import access_log
+import asyncio
+import json
+import logging
+import os
+import signal
+
+logging.basicConfig(
+  level=logging.WARNING,
+  format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+)
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("PYHTTP_HOST", "0.0.0.0")
+PORT = int(os.getenv("PYHTTP_PORT", "80"))
+RULES_FILE = os.getenv("HTTP_ROUTES_FILE", "/etc/yozakura/rules/http_routes.json")
+ACCESS_LOG = os.getenv("PYHTTP_ACCESS_LOG", "/var/log/pyhttp/access.log")
+UPSTREAM_MAX_IDLE = int(os.getenv("PYHTTP_UPSTREAM_KEEPALIVE", "32"))
+UPSTREAM_IDLE_TIMEOUT = float(os.getenv("PYHTTP_UPSTREAM_KEEPALIVE_TIMEOUT", "60"))
+CONNECT_TIMEOUT = float(os.getenv("PYHTTP_CONNECT_TIMEOUT", "60"))
+READ_TIMEOUT = float(os.getenv("PYHTTP_READ_TIMEOUT", "60"))
+CLIENT_TIMEOUT = float(os.getenv("PYHTTP_KEEPALIVE_TIMEOUT", "75"))
+STATUS_HOST = os.getenv("PYHTTP_STATUS_HOST", "127.0.0.1")
+STATUS_PORT = int(os.getenv("PYHTTP_STATUS_PORT", "8081"))
+LOG_FLUSH_INTERVAL = 1.0
+
+try:
+  import uvloop
+except ImportError:
+  uvloop = None
+
+async def _flush_loop(log):
+  while True:
+    await asyncio.sleep(LOG_FLUSH_INTERVAL)
+    log.flush()
+
+def _status_handler(proxy):
+  async def handle(reader, writer):
+    try:
+      await asyncio.wait_for(protocol.read_head(reader), 5)
+      body = json.dumps({"upstreams": proxy.stats()}).encode("utf-8")
+      writer.write(
+        b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+        + body
+      )
+      await writer.drain()
+    except Exception:
+      logger.debug("Status request failed", exc_info=True)
+    finally:
+      writer.close()
+  return handle
+
+async def serve():
+  router = rules.load_router(RULES_FILE)
+  log = access_log.AccessLog(ACCESS_LOG)
+  proxy = handler.ProxyHandler(
+    router,
+    max_idle=UPSTREAM_MAX_IDLE,
+    upstream_idle_timeout=UPSTREAM_IDLE_TIMEOUT,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    client_timeout=CLIENT_TIMEOUT,
+    access_log=log,
+  )
+
+  server = await asyncio.start_server(proxy, HOST, PORT, limit=protocol.MAX_HEAD_SIZE, backlog=1024)
+  status = await asyncio.start_server(_status_handler(proxy), STATUS_HOST, STATUS_PORT)
+  flusher = asyncio.ensure_future(_flush_loop(log))
+  stop = asyncio.Event()
+
+  loop = asyncio.get_running_loop()
+  for signum in (signal.SIGINT, signal.SIGTERM):
+    loop.add_signal_handler(signum, stop.set)
+
+  logger.info("HTTP dispatcher listening on %s:%s", HOST, PORT)
+  try:
+    async with server, status:
+      await stop.wait()
+  finally:
+    flusher.cancel()
+    proxy.close()
+    log.close()
+
+if __name__ == "__main__":
+  if uvloop is not None:
+    uvloop.install()
+  asyncio.run(serve())
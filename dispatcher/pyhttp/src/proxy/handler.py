@@ -0,0 +1,262 @@
+from proxy import protocol
+from proxy.pool import UpstreamPool
+import asyncio
+import base64
+import itertools
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+ERROR_BODIES = {
+  400: b"<html><head><title>400 Bad Request</title></head><body><center><h1>400 Bad Request</h1></center></body></html>\r\n",
+  408: b"<html><head><title>408 Request Time-out</title></head><body><center><h1>408 Request Time-out</h1></center></body></html>\r\n",
+  502: b"<html><head><title>502 Bad Gateway</title></head><body><center><h1>502 Bad Gateway</h1></center></body></html>\r\n",
+  504: b"<html><head><title>504 Gateway Time-out</title></head><body><center><h1>504 Gateway Time-out</h1></center></body></html>\r\n",
+}
+ERROR_REASONS = {400: "Bad Request", 408: "Request Time-out", 502: "Bad Gateway", 504: "Gateway Time-out"}
+
+def _remote_user(authorization: str) -> str:
+  scheme, _, token = authorization.partition(" ")
+  if scheme.lower() != "basic" or not token:
+    return ""
+  try:
+    return base64.b64decode(token.strip(), validate=True).decode("utf-8", errors="replace").partition(":")[0]
+  except ValueError:
+    return ""
+
+def _seconds(value) -> str:
+  return "" if value is None else f"{value:.3f}"
+
+class ProxyHandler:
+  def __init__(self, router, max_idle: int, upstream_idle_timeout: float, connect_timeout: float,
+               read_timeout: float, client_timeout: float, access_log):
+    self.router = router
+    self.read_timeout = read_timeout
+    self.client_timeout = client_timeout
+    self.access_log = access_log
+    self.serials = itertools.count(1)
+    self.pools = {
+      name: UpstreamPool(name, host, port, max_idle, upstream_idle_timeout, connect_timeout)
+      for name, (host, port) in router.upstreams.items()
+    }
+
+  async def __call__(self, reader, writer):
+    serial = next(self.serials)
+    peer = writer.get_extra_info("peername") or ("", 0)
+    requests = 0
+
+    try:
+      while True:
+        try:
+          head = await asyncio.wait_for(protocol.read_head(reader), self.client_timeout)
+        except asyncio.TimeoutError:
+          break
+        if head is None:
+          break
+
+        requests += 1
+        started = time.monotonic()
+        entry = {
+          "connection_serial": str(serial),
+          "connection_requests": str(requests),
+          "request_id": os.urandom(16).hex(),
+          "src_ip": peer[0],
+          "src_port": str(peer[1]),
+          "server_name": "_",
+          "scheme": "http",
+          "pipe": ".",
+        }
+
+        try:
+          request = protocol.parse_request(head)
+        except protocol.ProtocolError as e:
+          logger.debug("Rejecting request from %s: %s", peer[0], e)
+          await self._send_error(writer, 400, False, entry)
+          entry["request_length"] = str(len(head))
+          entry["request_time"] = _seconds(time.monotonic() - started)
+          self.access_log.write(entry)
+          break
+
+        try:
+          keep_alive = await self._proxy(request, reader, writer, peer, entry)
+        finally:
+          entry["request_time"] = _seconds(time.monotonic() - started)
+          self.access_log.write(entry)
+        if not keep_alive:
+          break
+
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, protocol.ProtocolError) as e:
+      logger.debug("Client connection %s closed: %s", peer[0], e)
+    except Exception:
+      logger.exception("Unexpected error handling client %s", peer[0])
+    finally:
+      try:
+        writer.close()
+      except Exception:
+        pass
+
+  async def _proxy(self, request, reader, writer, peer, entry) -> bool:
+    _, _, args = request.target.partition("?")
+    user_agent = request.get("user-agent")
+    route = self.router.route(request.target, user_agent)
+    pool = self.pools[route]
+
+    entry.update({
+      "request_data": request.start_line,
+      "request_uri": request.target,
+      "args": args,
+      "request_method": request.method,
+      "server_protocol": request.version,
+      "remote_user": _remote_user(request.get("authorization")),
+      "http_referer": request.get("referer"),
+      "http_user_agent": user_agent,
+      "http_x_forwarded_for": request.get("x-forwarded-for"),
+      "http_host": request.get("host"),
+      "http_cf_ray": request.get("cf-ray"),
+      "proxy_host": pool.proxy_host,
+    })
+
+    try:
+      framing, length = protocol.body_framing(request)
+    except protocol.ProtocolError as e:
+      logger.debug("Rejecting request from %s: %s", peer[0], e)
+      entry["request_length"] = str(request.head_size)
+      await self._send_error(writer, 400, False, entry)
+      return False
+    keep_alive = request.keep_alive
+
+    if "100-continue" in request.tokens("expect") and framing != "none":
+      writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+
+    upstream_head = self._upstream_head(request, peer, framing)
+    request_body = 0
+    upstream = None
+    upstream_started = time.monotonic()
+
+    try:
+      for attempt in range(2):
+        upstream, reused = await pool.acquire()
+        entry["upstream"] = upstream.address
+        entry["upstream_connect_time"] = "0.000" if reused else _seconds(time.monotonic() - upstream_started)
+        try:
+          upstream.writer.write(upstream_head)
+          try:
+            request_body = await asyncio.wait_for(
+              protocol.copy_body(reader, upstream.writer, framing, length),
+              self.read_timeout,
+            )
+          except asyncio.TimeoutError:
+            return await self._fail(writer, pool, upstream, 408, entry, request_body, request)
+          await upstream.writer.drain()
+          response = await self._read_response(upstream)
+          break
+        except (ConnectionError, asyncio.IncompleteReadError, protocol.ProtocolError):
+          pool.discard(upstream)
+          upstream = None
+          if reused and framing == "none" and attempt == 0:
+            continue
+          raise
+      entry["upstream_header_time"] = _seconds(time.monotonic() - upstream_started)
+    except asyncio.TimeoutError:
+      return await self._fail(writer, pool, upstream, 504, entry, request_body, request)
+    except (OSError, asyncio.IncompleteReadError, protocol.ProtocolError):
+      return await self._fail(writer, pool, upstream, 502, entry, request_body, request)
+
+    entry["request_length"] = str(request.head_size + request_body)
+    entry["status"] = str(response.status)
+
+    response_framing, response_length = protocol.body_framing(response, request.method)
+    upstream_reusable = response_framing != "close" and "close" not in response.tokens("connection")
+    dechunk = response_framing == "chunked" and request.version == "HTTP/1.0"
+    if response_framing == "close" or dechunk:
+      keep_alive = False
+
+    headers = [(name, value) for name, value in response.headers if name.lower() not in protocol.HOP_BY_HOP]
+    if response_framing == "chunked" and not dechunk:
+      headers.append(("Transfer-Encoding", "chunked"))
+    headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+    head = protocol.serialize_head(f"HTTP/1.1 {response.status} {response.reason}".rstrip(), headers)
+    writer.write(head)
+
+    body = 0
+    try:
+      body = await asyncio.wait_for(
+        protocol.copy_body(upstream.reader, writer, response_framing, response_length, dechunk),
+        self.read_timeout,
+      )
+      await writer.drain()
+    except Exception:
+      upstream_reusable = False
+      keep_alive = False
+      raise
+    finally:
+      entry["body_bytes_sent"] = str(body)
+      entry["bytes_sent"] = str(len(head) + body)
+      entry["upstream_response_length"] = str(body)
+      entry["upstream_response_time"] = _seconds(time.monotonic() - upstream_started)
+      if upstream_reusable:
+        pool.release(upstream)
+      else:
+        pool.discard(upstream)
+
+    return keep_alive
+
+  async def _read_response(self, upstream):
+    while True:
+      head = await asyncio.wait_for(protocol.read_head(upstream.reader), self.read_timeout)
+      if head is None:
+        raise asyncio.IncompleteReadError(b"", None)
+      response = protocol.parse_response(head)
+      if 100 <= response.status < 200 and response.status != 101:
+        continue
+      return response
+
+  def _upstream_head(self, request, peer, framing: str) -> bytes:
+    headers = [(name, value) for name, value in request.headers
+               if name.lower() not in protocol.HOP_BY_HOP and name.lower() not in ("x-real-ip", "x-forwarded-for")
+               and not (framing == "chunked" and name.lower() == "content-length")]
+    forwarded = request.get("x-forwarded-for")
+    headers.append(("X-Real-IP", peer[0]))
+    headers.append(("X-Forwarded-For", f"{forwarded}, {peer[0]}" if forwarded else peer[0]))
+    if framing == "chunked":
+      headers.append(("Transfer-Encoding", "chunked"))
+    headers.append(("Connection", "keep-alive"))
+    return protocol.serialize_head(f"{request.method} {request.target} HTTP/1.1", headers)
+
+  async def _fail(self, writer, pool, upstream, status: int, entry: dict, request_body: int, request) -> bool:
+    if status == 408:
+      logger.debug("Client request body to %s timed out", pool.proxy_host)
+    else:
+      logger.warning("Upstream %s failed with %d", pool.proxy_host, status)
+    if upstream is not None:
+      pool.discard(upstream)
+    entry["request_length"] = str(request.head_size + request_body)
+    entry["upstream_response_time"] = entry.get("upstream_connect_time", "")
+    await self._send_error(writer, status, False, entry)
+    return False
+
+  async def _send_error(self, writer, status: int, keep_alive: bool, entry: dict):
+    body = ERROR_BODIES[status]
+    head = (
+      f"HTTP/1.1 {status} {ERROR_REASONS[status]}\r\n"
+      "Content-Type: text/html\r\n"
+      f"Content-Length: {len(body)}\r\n"
+      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    ).encode("latin-1")
+    entry["status"] = str(status)
+    entry["body_bytes_sent"] = str(len(body))
+    entry["bytes_sent"] = str(len(head) + len(body))
+    writer.write(head + body)
+    try:
+      await writer.drain()
+    except ConnectionError:
+      pass
+
+  def close(self):
+    for pool in self.pools.values():
+      pool.close()
+
+  def stats(self) -> dict:
+    return {name: dict(pool.stats, idle=len(pool.idle)) for name, pool in self.pools.items()}
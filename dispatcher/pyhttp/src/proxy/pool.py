@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Upstream:
+  def __init__(self, reader, writer):
+    self.reader = reader
+    self.writer = writer
+    self.last_used = time.monotonic()
+    peer = writer.get_extra_info("peername") or ("", 0)
+    self.address = f"{peer[0]}:{peer[1]}"
+
+  def close(self):
+    try:
+      self.writer.close()
+    except Exception:
+      pass
+
+class UpstreamPool:
+  def __init__(self, name: str, host: str, port: int, max_idle: int = 32,
+               idle_timeout: float = 60.0, connect_timeout: float = 5.0):
+    self.name = name
+    self.host = host
+    self.port = port
+    self.proxy_host = f"{host}:{port}"
+    self.max_idle = max_idle
+    self.idle_timeout = idle_timeout
+    self.connect_timeout = connect_timeout
+    self.idle = []
+    self.stats = {"connects": 0, "reused": 0, "released": 0, "discarded": 0, "connect_errors": 0}
+
+  async def acquire(self):
+    now = time.monotonic()
+    while self.idle:
+      upstream = self.idle.pop()
+      if now - upstream.last_used > self.idle_timeout or upstream.reader.at_eof():
+        upstream.close()
+        continue
+      self.stats["reused"] += 1
+      return upstream, True
+
+    try:
+      reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.connect_timeout)
+    except (OSError, asyncio.TimeoutError):
+      self.stats["connect_errors"] += 1
+      raise
+    self.stats["connects"] += 1
+    return Upstream(reader, writer), False
+
+  def release(self, upstream: Upstream):
+    if len(self.idle) >= self.max_idle or upstream.reader.at_eof():
+      self.discard(upstream)
+      return
+    upstream.last_used = time.monotonic()
+    self.idle.append(upstream)
+    self.stats["released"] += 1
+
+  def discard(self, upstream: Upstream):
+    self.stats["discarded"] += 1
+    upstream.close()
+
+  def close(self):
+    while self.idle:
+      self.idle.pop().close()
@@ -0,0 +1,169 @@
+import asyncio
+
+MAX_HEAD_SIZE = 64 * 1024
+COPY_CHUNK = 64 * 1024
+
+HOP_BY_HOP = frozenset((
+  "connection", "keep-alive", "proxy-connection", "proxy-authenticate",
+  "te", "trailer", "transfer-encoding", "upgrade", "expect",
+))
+
+class ProtocolError(Exception):
+  pass
+
+class Message:
+  def __init__(self, start_line: str, headers: list, head_size: int):
+    self.start_line = start_line
+    self.headers = headers
+    self.head_size = head_size
+    self.index = {}
+    for name, value in headers:
+      key = name.lower()
+      if key in self.index:
+        self.index[key] = self.index[key] + ", " + value
+      else:
+        self.index[key] = value
+
+  def get(self, name: str, default: str = "") -> str:
+    return self.index.get(name, default)
+
+  def tokens(self, name: str) -> set:
+    return {token.strip().lower() for token in self.get(name).split(",") if token.strip()}
+
+class Request(Message):
+  def __init__(self, start_line: str, headers: list, head_size: int):
+    super().__init__(start_line, headers, head_size)
+    parts = start_line.split(" ")
+    if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+      raise ProtocolError(f"Malformed request line: {start_line[:200]!r}")
+    self.method, self.target, self.version = parts
+
+  @property
+  def keep_alive(self) -> bool:
+    connection = self.tokens("connection")
+    if self.version == "HTTP/1.0":
+      return "keep-alive" in connection
+    return "close" not in connection
+
+class Response(Message):
+  def __init__(self, start_line: str, headers: list, head_size: int):
+    super().__init__(start_line, headers, head_size)
+    parts = start_line.split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/1.") or not parts[1].isdigit():
+      raise ProtocolError(f"Malformed status line: {start_line[:200]!r}")
+    self.version = parts[0]
+    self.status = int(parts[1])
+    self.reason = parts[2] if len(parts) > 2 else ""
+
+async def read_head(reader):
+  try:
+    head = await reader.readuntil(b"\r\n\r\n")
+  except asyncio.IncompleteReadError as e:
+    if e.partial.strip():
+      raise ProtocolError("Connection closed mid-header")
+    return None
+  except asyncio.LimitOverrunError:
+    raise ProtocolError("Header section too large")
+  return head
+
+def _parse_head(head: bytes):
+  lines = head[:-4].decode("latin-1").split("\r\n")
+  headers = []
+  for line in lines[1:]:
+    name, sep, value = line.partition(":")
+    if not sep or not name or name != name.strip():
+      raise ProtocolError(f"Malformed header line: {line[:200]!r}")
+    headers.append((name, value.strip()))
+  return lines[0], headers
+
+def parse_request(head: bytes) -> Request:
+  start_line, headers = _parse_head(head)
+  return Request(start_line, headers, len(head))
+
+def parse_response(head: bytes) -> Response:
+  start_line, headers = _parse_head(head)
+  return Response(start_line, headers, len(head))
+
+def body_framing(message: Message, request_method: str = None):
+  if isinstance(message, Response):
+    if request_method == "HEAD" or message.status in (204, 304) or 100 <= message.status < 200:
+      return "none", 0
+
+  if "chunked" in message.tokens("transfer-encoding"):
+    if isinstance(message, Request) and message.get("content-length"):
+      raise ProtocolError("Both Transfer-Encoding and Content-Length present")
+    return "chunked", None
+
+  length = message.get("content-length")
+  if length:
+    if not length.isdigit():
+      raise ProtocolError(f"Invalid Content-Length: {length[:50]!r}")
+    return "length", int(length)
+
+  if isinstance(message, Response):
+    return "close", None
+  return "none", 0
+
+def serialize_head(start_line: str, headers: list) -> bytes:
+  lines = [start_line]
+  lines.extend(f"{name}: {value}" for name, value in headers)
+  return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def copy_body(reader, writer, framing: str, length, dechunk: bool = False) -> int:
+  copied = 0
+
+  if framing == "length":
+    remaining = length
+    while remaining > 0:
+      chunk = await reader.read(min(COPY_CHUNK, remaining))
+      if not chunk:
+        raise ProtocolError("Body truncated")
+      writer.write(chunk)
+      remaining -= len(chunk)
+      copied += len(chunk)
+      await writer.drain()
+
+  elif framing == "chunked":
+    while True:
+      size_line = await reader.readuntil(b"\r\n")
+      try:
+        size = int(size_line.split(b";", 1)[0].strip(), 16)
+      except ValueError:
+        raise ProtocolError("Invalid chunk size")
+      if not dechunk:
+        writer.write(size_line)
+
+      if size == 0:
+        while True:
+          trailer = await reader.readuntil(b"\r\n")
+          if not dechunk:
+            writer.write(trailer)
+          if trailer == b"\r\n":
+            break
+        await writer.drain()
+        break
+
+      remaining = size
+      while remaining > 0:
+        chunk = await reader.read(min(COPY_CHUNK, remaining))
+        if not chunk:
+          raise ProtocolError("Chunk truncated")
+        writer.write(chunk)
+        remaining -= len(chunk)
+        copied += len(chunk)
+      if await reader.readexactly(2) != b"\r\n":
+        raise ProtocolError("Missing chunk terminator")
+      if not dechunk:
+        writer.write(b"\r\n")
+      await writer.drain()
+
+  elif framing == "close":
+    while True:
+      chunk = await reader.read(COPY_CHUNK)
+      if not chunk:
+        break
+      writer.write(chunk)
+      copied += len(chunk)
+      await writer.drain()
+
+  return copied
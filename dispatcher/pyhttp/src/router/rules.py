@@ -0,0 +1,64 @@
+from urllib.parse import unquote_to_bytes
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("uri", "user_agent")
+
+def unescape_uri(uri: str) -> str:
+  # Same semantics as ngx.unescape_uri: %XX escapes and "+" as a space.
+  return unquote_to_bytes(uri.replace("+", " ").encode("latin-1", errors="ignore")).decode("latin-1")
+
+class Rule:
+  def __init__(self, target: str, fields: list, patterns: list):
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+      raise ValueError(f"Unknown rule fields for {target}: {sorted(unknown)}")
+    self.target = target
+    self.fields = tuple(fields)
+    literals = sorted({pattern.lower() for pattern in patterns}, key=len, reverse=True)
+    self.matcher = re.compile("|".join(re.escape(literal) for literal in literals)) if literals else None
+
+  def matches(self, values: dict) -> bool:
+    if self.matcher is None:
+      return False
+    search = self.matcher.search
+    for field in self.fields:
+      for value in values[field]:
+        if search(value):
+          return True
+    return False
+
+class Router:
+  def __init__(self, rules: list, default: str, upstreams: dict):
+    self.rules = rules
+    self.default = default
+    self.upstreams = upstreams
+
+  def route(self, request_uri: str, user_agent: str) -> str:
+    uri = request_uri.lower()
+    values = {
+      "uri": (uri, unescape_uri(uri)) if "%" in uri or "+" in uri else (uri,),
+      "user_agent": (user_agent.lower(),),
+    }
+    for rule in self.rules:
+      if rule.matches(values):
+        return rule.target
+    return self.default
+
+def load_router(path: str) -> Router:
+  with open(path, "r", encoding="utf-8") as f:
+    data = json.load(f)
+
+  upstreams = {name: (spec["host"], int(spec.get("port", 80))) for name, spec in data["upstreams"].items()}
+  rules = [Rule(rule["target"], rule.get("fields", ["uri"]), rule["patterns"]) for rule in data.get("rules", [])]
+  default = data.get("default", "heralding")
+
+  for target in [default] + [rule.target for rule in rules]:
+    if target not in upstreams:
+      raise ValueError(f"Route target {target} has no upstream")
+
+  logger.info("Loaded %d routing rules from %s", len(rules), path)
+  return Router(rules, default, upstreams)
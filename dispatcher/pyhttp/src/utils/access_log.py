@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+  "msec", "connection_serial", "connection_requests", "pid", "request_id", "request_length",
+  "src_ip", "remote_user", "src_port", "time_local", "time_iso8601", "request_data", "request_uri",
+  "args", "status", "body_bytes_sent", "bytes_sent", "http_referer", "http_user_agent",
+  "http_x_forwarded_for", "http_host", "server_name", "request_time", "upstream",
+  "upstream_connect_time", "upstream_header_time", "upstream_response_time",
+  "upstream_response_length", "upstream_cache_status", "ssl_protocol", "ssl_cipher", "scheme",
+  "request_method", "server_protocol", "pipe", "gzip_ratio", "http_cf_ray", "proxy_host",
+)
+
+def _utc_offset(moment) -> str:
+  offset = -(time.altzone if moment.tm_isdst > 0 and time.daylight else time.timezone)
+  sign = "+" if offset >= 0 else "-"
+  offset = abs(offset)
+  return f"{sign}{offset // 3600:02d}{offset % 3600 // 60:02d}"
+
+class TimeFormatter:
+  def __init__(self):
+    self.second = -1
+    self.local = ""
+    self.iso = ""
+
+  def format(self, now: float):
+    second = int(now)
+    if second != self.second:
+      moment = time.localtime(second)
+      offset = _utc_offset(moment)
+      self.local = time.strftime("%d/%b/%Y:%H:%M:%S ", moment) + offset
+      self.iso = time.strftime("%Y-%m-%dT%H:%M:%S", moment) + offset[:3] + ":" + offset[3:]
+      self.second = second
+    return self.local, self.iso
+
+class AccessLog:
+  def __init__(self, path: str):
+    self.path = path
+    self.pid = str(os.getpid())
+    self.clock = TimeFormatter()
+    self.file = None
+    if path:
+      os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+      self.file = open(path, "a", encoding="utf-8", buffering=1024 * 1024)
+
+  def write(self, entry: dict):
+    if self.file is None:
+      return
+    now = time.time()
+    entry["msec"] = f"{now:.3f}"
+    entry["pid"] = self.pid
+    entry["time_local"], entry["time_iso8601"] = self.clock.format(now)
+    try:
+      self.file.write(json.dumps({field: entry.get(field, "") for field in FIELDS}) + "\n")
+    except OSError:
+      logger.exception("Failed to write access log")
+
+  def flush(self):
+    if self.file is not None:
+      try:
+        self.file.flush()
+      except OSError:
+        logger.exception("Failed to flush access log")
+
+  def close(self):
+    if self.file is not None:
+      self.flush()
+      self.file.close()
+      self.file = None
@@ -0,0 +1,131 @@
+from output import sinks
+from parsers import formats
+from tailer import checkpoint, file_tailer, inotify_watch
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import time
+
+logging.basicConfig(
+  level=logging.WARNING,
+  format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+)
+
+logger = logging.getLogger(__name__)
+
+SOURCES = (
+  ("/data/paramiko/paramiko.log", "Paramiko"),
+  ("/data/paramiko/session_map.log", "SessionMap"),
+  ("/data/heralding/auth.csv", "Heralding"),
+  ("/data/wordpot/log/wordpot.log", "Wordpot"),
+  ("/data/h0neytr4p/log/log.json", "H0neytr4p"),
+  ("/data/tanner/log/tanner_report.json", "Tanner"),
+  ("/data/cowrie/cowrie.json", "Cowrie"),
+)
+
+OUTPUT = os.getenv("AGGREGATOR_OUTPUT", "logstash")
+LOGSTASH_HOST = os.getenv("AGGREGATOR_LOGSTASH_HOST", "logstash")
+LOGSTASH_PORT = int(os.getenv("AGGREGATOR_LOGSTASH_PORT", "5044"))
+ES_URL = os.getenv("ELASTIC_HOSTS", "https://elasticsearch:9200")
+ES_INDEX = os.getenv("AGGREGATOR_ES_INDEX", "logstash-%Y.%m.%d")
+ES_USER = os.getenv("ELASTIC_USER", "")
+ES_PASSWORD = os.getenv("ELASTIC_PASSWORD", "")
+ES_CA_CERT = os.getenv("AGGREGATOR_ES_CA_CERT", "/certs/ca/ca.crt")
+CHECKPOINT_PATH = os.getenv("AGGREGATOR_CHECKPOINT", "/var/lib/aggregator/checkpoint.json")
+DEAD_LETTER_PATH = os.getenv("AGGREGATOR_DEAD_LETTER", "/var/lib/aggregator/dead_letter.ndjson")
+START_AT_END = os.getenv("AGGREGATOR_START_POSITION", "end") == "end"
+BATCH_SIZE = int(os.getenv("AGGREGATOR_BATCH_SIZE", "1000"))
+FLUSH_INTERVAL = float(os.getenv("AGGREGATOR_FLUSH_INTERVAL", "1.0"))
+DEDUP_SIZE = int(os.getenv("AGGREGATOR_DEDUP_SIZE", "100000"))
+RETRY_MAX = 60.0
+
+class Deduplicator:
+  def __init__(self, size: int):
+    self.size = size
+    self.seen = OrderedDict()
+
+  def is_duplicate(self, source_type: str, line: bytes) -> bool:
+    key = hashlib.blake2b(line, digest_size=16, person=source_type.encode("utf-8")[:16]).digest()
+    if key in self.seen:
+      self.seen.move_to_end(key)
+      return True
+
+    self.seen[key] = None
+    if len(self.seen) > self.size:
+      self.seen.popitem(last=False)
+    return False
+
+def _build_sink():
+  if OUTPUT == "elasticsearch":
+    return sinks.ElasticsearchSink(ES_URL, ES_INDEX, ES_USER, ES_PASSWORD, ES_CA_CERT, dead_letter=sinks.DeadLetterFile(DEAD_LETTER_PATH))
+  return sinks.LogstashSink(LOGSTASH_HOST, LOGSTASH_PORT)
+
+def _build_tailers(positions: dict) -> list:
+  tailers = []
+  for path, source_type in SOURCES:
+    saved = positions.get(path, {})
+    tailers.append(file_tailer.FileTailer(
+      path,
+      source_type,
+      inode=saved.get("inode"),
+      offset=saved.get("offset"),
+      start_at_end=START_AT_END,
+    ))
+  return tailers
+
+def _flush(sink, store, tailers, pending: list):
+  delay = 1.0
+  while pending:
+    try:
+      pending[:] = sink.send(pending)
+    except sinks.SinkError:
+      logger.warning("Output unavailable, retrying %d events in %.0fs", len(pending), delay)
+    else:
+      if not pending:
+        break
+      logger.warning("Retrying %d events rejected as temporary in %.0fs", len(pending), delay)
+    time.sleep(delay)
+    delay = min(RETRY_MAX, delay * 2)
+
+  store.save({tailer.path: tailer.position() for tailer in tailers})
+  pending.clear()
+
+def run():
+  store = checkpoint.CheckpointStore(CHECKPOINT_PATH)
+  tailers = _build_tailers(store.load())
+  watcher = inotify_watch.DirectoryWatcher({tailer.directory for tailer in tailers})
+  dedup = Deduplicator(DEDUP_SIZE)
+  sink = _build_sink()
+
+  pending = []
+  oldest = None
+
+  try:
+    while True:
+      for tailer in tailers:
+        for line in tailer.read_lines():
+          if not line.strip() or dedup.is_duplicate(tailer.source_type, line):
+            continue
+          event = formats.normalize(tailer.source_type, line)
+          if event is None:
+            continue
+          pending.append(event)
+          if oldest is None:
+            oldest = time.time()
+
+      if pending and (len(pending) >= BATCH_SIZE or time.time() - oldest >= FLUSH_INTERVAL):
+        _flush(sink, store, tailers, pending)
+        oldest = None
+        continue
+
+      timeout = FLUSH_INTERVAL if oldest is None else max(0.0, FLUSH_INTERVAL - (time.time() - oldest))
+      watcher.wait(timeout)
+  finally:
+    watcher.close()
+    sink.close()
+    for tailer in tailers:
+      tailer.close()
+
+if __name__ == "__main__":
+  run()
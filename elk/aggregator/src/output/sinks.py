@@ -0,0 +1,168 @@
+from urllib.parse import urlsplit
+import base64
+import datetime
+import http.client
+import json
+import logging
+import os
+import re
+import socket
+import ssl
+
+try:
+  import orjson
+
+  def dumps(obj) -> bytes:
+    return orjson.dumps(obj)
+
+except ImportError:
+  import json
+
+  def dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+logger = logging.getLogger(__name__)
+
+BULK_ERRORS = re.compile(rb'"errors"\s*:\s*true')
+
+class SinkError(Exception):
+  pass
+
+class DeadLetterFile:
+  def __init__(self, path: str):
+    self.path = path
+
+  def write(self, events: list, reason: str):
+    logger.error("Dead-lettering %d events: %s", len(events), reason)
+    try:
+      directory = os.path.dirname(self.path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      with open(self.path, "ab") as f:
+        for event in events:
+          f.write(dumps({"reason": reason, "event": event}) + b"\n")
+    except OSError:
+      logger.exception("Failed to write dead-letter file %s", self.path)
+
+class LogstashSink:
+  def __init__(self, host: str, port: int, timeout: float = 10.0):
+    self.host = host
+    self.port = port
+    self.timeout = timeout
+    self.sock = None
+
+  def send(self, events: list):
+    payload = b"".join(dumps(event) + b"\n" for event in events)
+    try:
+      if self.sock is None:
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+      self.sock.sendall(payload)
+    except OSError as e:
+      self.close()
+      raise SinkError(f"Logstash send failed: {e}") from e
+    return []
+
+  def close(self):
+    if self.sock is not None:
+      try:
+        self.sock.close()
+      except OSError:
+        pass
+    self.sock = None
+
+class ElasticsearchSink:
+  def __init__(self, url: str, index: str, username: str = "", password: str = "", ca_cert: str = "", timeout: float = 10.0,
+               dead_letter: DeadLetterFile = None):
+    parts = urlsplit(url)
+    self.scheme = parts.scheme or "http"
+    self.host = parts.hostname
+    self.port = parts.port or (443 if self.scheme == "https" else 80)
+    self.path = parts.path.rstrip("/") + "/_bulk"
+    self.index = index
+    self.ca_cert = ca_cert
+    self.timeout = timeout
+    self.conn = None
+    self.dead_letter = dead_letter
+    self.headers = {"Content-Type": "application/x-ndjson", "Connection": "keep-alive"}
+    if username:
+      token = base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+      self.headers["Authorization"] = f"Basic {token}"
+
+  def _index_for(self, event: dict) -> str:
+    try:
+      moment = datetime.datetime.fromisoformat(event["@timestamp"])
+    except (KeyError, TypeError, ValueError):
+      moment = datetime.datetime.now(datetime.timezone.utc)
+    return moment.strftime(self.index)
+
+  def _connect(self):
+    if self.conn is None:
+      if self.scheme == "https":
+        context = ssl.create_default_context(cafile=self.ca_cert or None)
+        self.conn = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=context)
+      else:
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+    return self.conn
+
+  def send(self, events: list):
+    body = b"".join(
+      dumps({"index": {"_index": self._index_for(event)}}) + b"\n" + dumps(event) + b"\n"
+      for event in events
+    )
+
+    try:
+      conn = self._connect()
+      conn.request("POST", self.path, body=body, headers=self.headers)
+      response = conn.getresponse()
+      payload = response.read()
+    except Exception as e:
+      self.close()
+      raise SinkError(f"Elasticsearch bulk failed: {e}") from e
+
+    if response.status == 429 or response.status >= 500:
+      raise SinkError(f"Elasticsearch bulk returned {response.status}: {payload[:200]!r}")
+    if response.status >= 300:
+      self._dead_letter(events, f"bulk request returned {response.status}: {payload[:200]!r}")
+      return []
+    if not BULK_ERRORS.search(payload):
+      return []
+
+    try:
+      items = json.loads(payload)["items"]
+    except (KeyError, ValueError):
+      raise SinkError("Elasticsearch bulk response with errors could not be parsed")
+
+    retry = []
+    rejected = {}
+    for event, item in zip(events, items):
+      result = next(iter(item.values()), {})
+      status = result.get("status", 500)
+      if status < 300:
+        continue
+      if status == 429 or status >= 500:
+        retry.append(event)
+      else:
+        error = result.get("error") or {}
+        reason = error.get("type", str(status)) if isinstance(error, dict) else str(error)
+        rejected.setdefault(reason, []).append(event)
+
+    for reason, rejected_events in rejected.items():
+      self._dead_letter(rejected_events, reason)
+    if retry:
+      logger.warning("Elasticsearch asked to retry %d of %d events", len(retry), len(events))
+    return retry
+
+  def _dead_letter(self, events: list, reason: str):
+    if self.dead_letter is None:
+      logger.error("Dropping %d events rejected by Elasticsearch: %s", len(events), reason)
+      return
+    self.dead_letter.write(events, reason)
+
+  def close(self):
+    if self.conn is not None:
+      try:
+        self.conn.close()
+      except Exception:
+        pass
+    self.conn = None
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+import csv
+import datetime
+import logging
+import re
+
+try:
+  import orjson
+
+  def _loads(line: bytes):
+    return orjson.loads(line)
+
+except ImportError:
+  import json
+
+  def _loads(line: bytes):
+    return json.loads(line)
+
+logger = logging.getLogger(__name__)
+
+HERALDING_COLUMNS = ("timestamp", "auth_id", "session_id", "src_ip", "src_port", "dest_ip", "dest_port", "proto", "username", "password")
+URL_PATH_RE = re.compile(r"^(?:[a-zA-Z][a-zA-Z0-9+.-]*://[^/?#]*)?(/[^?#]*)")
+PORT_FIELDS = ("src_port", "dest_port")
+DISPATCHER_VERSION_RE = re.compile(r"SSH-2\.0-YozakuraDispatcher_(\w+)")
+COWRIE_SESSION_LIMIT = 100000
+
+_cowrie_purposes = OrderedDict()
+
+def _to_int(value):
+  try:
+    return int(value)
+  except (TypeError, ValueError):
+    return value
+
+def _rename(event: dict, old: str, new: str):
+  if old in event:
+    event[new] = event.pop(old)
+
+def _heralding_timestamp(value: str) -> str:
+  try:
+    moment = datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S.%f")
+  except ValueError:
+    moment = datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+  return moment.replace(tzinfo=datetime.timezone.utc).isoformat()
+
+def parse_json(line: bytes):
+  event = _loads(line)
+  return event if isinstance(event, dict) else None
+
+def parse_heralding_csv(line: bytes):
+  text = line.decode("utf-8", errors="replace")
+  if text.startswith("timestamp,"):
+    return None
+
+  row = next(csv.reader([text]), None)
+  if not row or len(row) < len(HERALDING_COLUMNS):
+    return None
+
+  event = dict(zip(HERALDING_COLUMNS, row))
+  event["timestamp"] = _heralding_timestamp(event["timestamp"])
+  return event
+
+def _normalize_dst(event: dict):
+  _rename(event, "dst_port", "dest_port")
+  _rename(event, "dst_ip", "dest_ip")
+
+def _normalize_cowrie(event: dict):
+  _normalize_dst(event)
+  session = event.get("session")
+  if not session:
+    return
+
+  if event.get("eventid") == "cowrie.client.version":
+    match = DISPATCHER_VERSION_RE.search(str(event.get("version", "")))
+    if match:
+      _cowrie_purposes[session] = match.group(1)
+      if len(_cowrie_purposes) > COWRIE_SESSION_LIMIT:
+        _cowrie_purposes.popitem(last=False)
+
+  purpose = _cowrie_purposes.get(session)
+  if purpose:
+    event["dispatcher_purpose"] = purpose
+
+def _normalize_tanner(event: dict):
+  peer = event.pop("peer", None)
+  if isinstance(peer, dict):
+    event["src_ip"] = peer.get("ip")
+    event["src_port"] = peer.get("port")
+  event["dest_port"] = 80
+
+def _normalize_wordpot(event: dict):
+  url = event.get("url")
+  if url and "request_uri" not in event:
+    match = URL_PATH_RE.match(url)
+    if match:
+      event["request_uri"] = match.group(1)
+
+PARSERS = {
+  "Paramiko": (parse_json, _normalize_dst),
+  "SessionMap": (parse_json, None),
+  "Heralding": (parse_heralding_csv, None),
+  "Wordpot": (parse_json, _normalize_wordpot),
+  "H0neytr4p": (parse_json, None),
+  "Tanner": (parse_json, _normalize_tanner),
+  "Cowrie": (parse_json, _normalize_cowrie),
+}
+
+def normalize(source_type: str, line: bytes):
+  parse, fix = PARSERS[source_type]
+
+  try:
+    event = parse(line)
+  except Exception:
+    logger.warning("Dropping unparsable %s line: %r", source_type, line[:200])
+    return None
+  if not event:
+    return None
+
+  if fix is not None:
+    fix(event)
+
+  for field in PORT_FIELDS:
+    if field in event:
+      event[field] = _to_int(event[field])
+
+  event["type"] = source_type
+  timestamp = event.get("timestamp")
+  if timestamp:
+    event["@timestamp"] = timestamp
+
+  return {key: value for key, value in event.items() if value not in (None, "")}
@@ -0,0 +1,27 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class CheckpointStore:
+  def __init__(self, path: str):
+    self.path = path
+
+  def load(self) -> dict:
+    try:
+      with open(self.path, "r") as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return {}
+    except Exception:
+      logger.exception("Failed to read checkpoint %s, starting fresh", self.path)
+      return {}
+
+  def save(self, positions: dict):
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w") as f:
+      json.dump(positions, f)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_path, self.path)
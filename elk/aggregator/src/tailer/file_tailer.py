@@ -0,0 +1,80 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class FileTailer:
+  def __init__(self, path: str, source_type: str, inode: int = None, offset: int = None, start_at_end: bool = True):
+    self.path = path
+    self.source_type = source_type
+    self.directory = os.path.dirname(path)
+    self.inode = inode
+    self.offset = offset or 0
+    self.start_at_end = start_at_end and offset is None
+    self.file = None
+
+  def position(self) -> dict:
+    return {"inode": self.inode, "offset": self.offset}
+
+  def _open(self) -> bool:
+    try:
+      f = open(self.path, "rb")
+    except FileNotFoundError:
+      return False
+
+    stat = os.fstat(f.fileno())
+    if self.inode != stat.st_ino:
+      if self.inode is not None:
+        logger.info("%s was rotated, reading new file from start", self.path)
+        self.offset = 0
+      elif self.start_at_end:
+        self.offset = stat.st_size
+      self.inode = stat.st_ino
+
+    if stat.st_size < self.offset:
+      logger.info("%s was truncated, reading from start", self.path)
+      self.offset = 0
+
+    self.start_at_end = False
+    self.file = f
+    return True
+
+  def _close(self):
+    if self.file is not None:
+      self.file.close()
+    self.file = None
+
+  def _rotated(self) -> bool:
+    try:
+      return os.stat(self.path).st_ino != self.inode
+    except FileNotFoundError:
+      return False
+
+  def read_lines(self, max_bytes: int = 1024 * 1024) -> list:
+    if self.file is None and not self._open():
+      return []
+
+    try:
+      if os.fstat(self.file.fileno()).st_size < self.offset:
+        self.offset = 0
+
+      self.file.seek(self.offset)
+      chunk = self.file.read(max_bytes)
+    except OSError:
+      logger.exception("Failed to read %s", self.path)
+      self._close()
+      return []
+
+    end = chunk.rfind(b"\n")
+    if end == -1:
+      if not chunk and self._rotated():
+        self._close()
+        return self.read_lines(max_bytes)
+      return []
+
+    complete = chunk[:end + 1]
+    self.offset += len(complete)
+    return complete.splitlines()
+
+  def close(self):
+    self._close()
@@ -0,0 +1,98 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+def _load_libc():
+  try:
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    libc.inotify_init1
+    return libc
+  except (OSError, AttributeError):
+    return None
+
+class DirectoryWatcher:
+  def __init__(self, directories, poll_interval: float = 1.0):
+    self.poll_interval = poll_interval
+    self.pending = set(directories)
+    self.watches = {}
+    self.fd = -1
+    self.libc = _load_libc()
+
+    if self.libc is not None:
+      self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+      if self.fd < 0:
+        logger.warning("inotify unavailable (errno %d), falling back to polling", ctypes.get_errno())
+    else:
+      logger.warning("libc inotify not found, falling back to polling")
+
+    self._add_pending()
+
+  def _add_pending(self):
+    if self.fd < 0:
+      return
+
+    for directory in list(self.pending):
+      if not os.path.isdir(directory):
+        continue
+      wd = self.libc.inotify_add_watch(self.fd, directory.encode("utf-8"), WATCH_MASK)
+      if wd < 0:
+        logger.warning("Failed to watch %s (errno %d)", directory, ctypes.get_errno())
+        continue
+      self.watches[wd] = directory
+      self.pending.discard(directory)
+      logger.info("Watching %s", directory)
+
+  def wait(self, timeout: float) -> set:
+    if self.fd < 0:
+      time.sleep(min(timeout, self.poll_interval))
+      return set()
+
+    if self.pending:
+      self._add_pending()
+      if self.pending:
+        timeout = min(timeout, self.poll_interval)
+
+    readable, _, _ = select.select([self.fd], [], [], timeout)
+    if not readable:
+      return set()
+
+    changed = set()
+    try:
+      data = os.read(self.fd, 64 * 1024)
+    except BlockingIOError:
+      return changed
+
+    offset = 0
+    while offset + EVENT_HEADER.size <= len(data):
+      wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+      offset += EVENT_HEADER.size + name_len
+      directory = self.watches.get(wd)
+      if directory is None:
+        continue
+      if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+        del self.watches[wd]
+        self.pending.add(directory)
+      changed.add(directory)
+
+    return changed
+
+  def close(self):
+    if self.fd >= 0:
+      os.close(self.fd)
+      self.fd = -1